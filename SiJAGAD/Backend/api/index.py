@@ -1,26 +1,34 @@
 import pandas as pd
+import numpy as np
 import os
+import json
+import uuid
 import time
+import threading
 import bleach
 import pytz 
-import requests 
 from typing import Optional, List, Dict, Any, Union, cast 
 from datetime import datetime, timedelta
+from pathlib import Path
 from io import BytesIO
 from collections import Counter
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from pydantic import BaseModel
-from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
 from openpyxl import load_workbook
 from openpyxl.styles import Border, Side
 
 # --- 0. KONFIGURASI AWAL ---
-load_dotenv()
+# Client Supabase dibuat lazy & dipakai bersama lewat siprima_core (pool HTTP/2, timeout, retry)
+from siprima_core import ArchiveUnavailable, DatabaseUnavailable, call_timeout, coalesce, compact_logs, cron_authorized, daily_counts, get_http_client, get_snapshot_store, get_supabase, is_missing_function, load_env, parse_day, probe, query_logs, read_coalesced, read_with_fallback, single_flight, use_credentials
+
+load_env(Path(__file__).resolve().parent / '.env', Path(__file__).resolve().parent.parent / '.env')
+use_credentials("SUPABASE_URL", "SUPABASE_SERVICE_KEY")
 
 app = FastAPI(
     title="SiJAGAD API",
@@ -29,19 +37,15 @@ app = FastAPI(
 )
 
 # --- 1. SETUP DATABASE & TELEGRAM ---
-SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
-SUPABASE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
-
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID", "")
+TELEGRAM_API_BASE = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org").rstrip("/")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    print("⚠️  WARNING: SUPABASE_URL atau SUPABASE_SERVICE_KEY belum diset di .env")
-
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-except Exception as e:
-    print(f"❌ Gagal koneksi ke Supabase: {e}")
+def get_db() -> Client:
+    client = get_supabase()
+    if client is None:
+        raise DatabaseUnavailable("Database Offline")
+    return client
 
 
 # --- 2. MODELS ---
@@ -61,6 +65,7 @@ class LetterSchema(BaseModel):
     file_url: Optional[str] = None
     user_email: Optional[str] = "System"
     lokasi: Optional[str] = None
+    version: Optional[int] = None  # optimistic concurrency: versi baris saat form dibuka
 
 
 # --- 3. HELPER FUNCTIONS ---
@@ -70,7 +75,7 @@ def sanitize_text(text: str) -> str:
 
 def log_activity_bg(user_email: str, action: str, target: str):
     try:
-        supabase.table("activity_sijagad").insert({
+        get_db().table("activity_sijagad").insert({
             "user_email": user_email,
             "action": action,
             "target": target,
@@ -88,61 +93,514 @@ def send_telegram_notif(message: str, specific_chat_id: Optional[str] = None):
         print("⚠️ Telegram Config Missing")
         return
     try:
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+        url = f"{TELEGRAM_API_BASE}/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
         payload = {"chat_id": target_chat_id, "text": message, "parse_mode": "Markdown"}
-        requests.post(url, json=payload)
+        get_http_client().post(url, json=payload, timeout=10)
     except Exception as e:
         print(f"❌ Gagal kirim Telegram: {e}")
 
+def build_upcoming_report(letters: List[Dict[str, Any]], today) -> str:
+    """Susun teks laporan H-90 dari daftar surat (hasil query atau cache bot)."""
+    today_str = today.strftime('%Y-%m-%d')
+    future_str = (today + timedelta(days=90)).strftime('%Y-%m-%d')
+    letters = sorted(
+        [l for l in letters
+         if today_str <= str(l.get('tanggal_akhir_garansi') or '') <= future_str
+         and l.get('status') not in ("Expired", "Selesai")],
+        key=lambda l: str(l.get('tanggal_akhir_garansi')))
+
+    if not letters:
+        return "✅ *AMAN TERKENDALI*\nTidak ada surat yang akan expired dalam 90 hari ke depan."
+
+    report_lines = []
+    for item in letters:
+        try:
+            tgl_akhir_str = str(item.get('tanggal_akhir_garansi'))
+            tgl_akhir = datetime.strptime(tgl_akhir_str, '%Y-%m-%d').date()
+            sisa_hari = (tgl_akhir - today).days
+            vendor = item.get('vendor', 'Unknown')
+            kontrak = item.get('nomor_kontrak', '-')
+
+            if sisa_hari <= 7: icon = "🔥" 
+            elif sisa_hari <= 30: icon = "⚠️"
+            else: icon = "⏳"
+
+            report_lines.append(f"{icon} *{vendor}*\n   └ ⏰ Sisa: *{sisa_hari} Hari* ({tgl_akhir_str})\n   └ 📄 No: `{kontrak}`")
+        except: continue
+
+    display_lines = report_lines[:15]
+    header = f"📊 *UPDATE SISA WAKTU SURAT* 📊\n_Per Tanggal: {today_str}_\n\n"
+    content = "\n".join(display_lines)
+    footer = f"\n\nTotal: {len(letters)} Surat mendekati jatuh tempo."
+    if len(letters) > 15: footer += f"\n_(...dan {len(letters)-15} lainnya)_"
+
+    return header + content + footer
+
+def today_manado():
+    return datetime.now(pytz.timezone('Asia/Makassar')).date()
+
 def generate_upcoming_report_text() -> str:
     """Helper Function: Membuat teks laporan H-90"""
     try:
-        tz_manado = pytz.timezone('Asia/Makassar') 
-        today = datetime.now(tz_manado).date()
+        today = today_manado()
         future_date = (today + timedelta(days=90)).strftime('%Y-%m-%d')
         today_str = today.strftime('%Y-%m-%d')
 
-        response = supabase.table("letters").select("vendor, nomor_kontrak, tanggal_akhir_garansi") \
+        # Lewat breaker: saat Supabase down, laporan langsung gagal alih-alih menunggu timeout
+        response = read_with_fallback(None, lambda: get_db().table("letters").select("vendor, nomor_kontrak, tanggal_akhir_garansi, status") \
             .eq("is_deleted", False) \
             .gte("tanggal_akhir_garansi", today_str) \
             .lte("tanggal_akhir_garansi", future_date) \
             .neq("status", "Expired") \
             .neq("status", "Selesai") \
             .order("tanggal_akhir_garansi", desc=False) \
-            .execute()
+            .execute())
             
         letters = cast(List[Dict[str, Any]], response.data or [])
-        
-        if not letters:
-            return "✅ *AMAN TERKENDALI*\nTidak ada surat yang akan expired dalam 90 hari ke depan."
-
-        report_lines = []
-        for item in letters:
-            try:
-                tgl_akhir_str = str(item.get('tanggal_akhir_garansi'))
-                tgl_akhir = datetime.strptime(tgl_akhir_str, '%Y-%m-%d').date()
-                sisa_hari = (tgl_akhir - today).days
-                vendor = item.get('vendor', 'Unknown')
-                kontrak = item.get('nomor_kontrak', '-')
-
-                if sisa_hari <= 7: icon = "🔥" 
-                elif sisa_hari <= 30: icon = "⚠️"
-                else: icon = "⏳"
-
-                report_lines.append(f"{icon} *{vendor}*\n   └ ⏰ Sisa: *{sisa_hari} Hari* ({tgl_akhir_str})\n   └ 📄 No: `{kontrak}`")
-            except: continue
-
-        display_lines = report_lines[:15]
-        header = f"📊 *UPDATE SISA WAKTU SURAT* 📊\n_Per Tanggal: {today_str}_\n\n"
-        content = "\n".join(display_lines)
-        footer = f"\n\nTotal: {len(letters)} Surat mendekati jatuh tempo."
-        if len(letters) > 15: footer += f"\n_(...dan {len(letters)-15} lainnya)_"
-
-        return header + content + footer
+        return build_upcoming_report(letters, today)
     except Exception as e:
         return f"❌ Terjadi kesalahan sistem: {str(e)}"
 
 
+# --- 3b. TELEGRAM BOT: DEDUP & CACHE ---
+# Webhook harus cepat dibalas; kalau lambat, Telegram mengirim ulang update yang
+# sama dan user menerima balasan ganda. Maka: update_id di-dedup, dan perintah
+# dijawab langsung di body response webhook dari cache data surat. Cache yang
+# kosong/basi dimuat sinkron (dibatasi timeout) di dalam request yang sama:
+# instance Vercel dibekukan setelah response, jadi tidak ada kerja di thread belakang.
+TELEGRAM_CACHE_TTL = float(os.getenv("TELEGRAM_CACHE_TTL") or 300)        # detik, data dianggap segar
+TELEGRAM_CACHE_MAX_AGE = float(os.getenv("TELEGRAM_CACHE_MAX_AGE") or 3600)  # detik, batas data basi yang masih boleh dipakai
+TELEGRAM_LOAD_TIMEOUT = float(os.getenv("TELEGRAM_LOAD_TIMEOUT") or 5)     # detik, muat cache di dalam webhook
+TELEGRAM_DEDUP_TTL = 24 * 3600
+TELEGRAM_DEDUP_TIMEOUT = 0.5
+TELEGRAM_LETTER_COLUMNS = "id, vendor, nomor_kontrak, tanggal_akhir_garansi, status, kategori, nominal_jaminan, bank_penerbit, jenis_garansi"
+
+class TelegramUpdateDedup:
+    """
+    update_id yang sudah dijawab (memori + tabel telegram_updates lintas instance).
+    Dicatat setelah balasan jadi, sehingga retry Telegram untuk update yang gagal
+    diproses tetap dijawab.
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._seen: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def seen_before(self, update_id: int) -> bool:
+        with self._lock:
+            if update_id in self._seen: return True
+        try:
+            with call_timeout(TELEGRAM_DEDUP_TIMEOUT):
+                res = get_db().table("telegram_updates").select("update_id").eq("update_id", update_id).limit(1).execute()
+            return bool(res.data)
+        except Exception as e:
+            print(f"⚠️ Telegram Dedup Store Error: {e}")
+            return False
+
+    def mark_processed(self, update_id: int):
+        now = time.time()
+        with self._lock:
+            if len(self._seen) > 5000:
+                self._seen = {k: v for k, v in self._seen.items() if now - v < self.ttl}
+            self._seen[update_id] = now
+        try:
+            with call_timeout(TELEGRAM_DEDUP_TIMEOUT):
+                get_db().table("telegram_updates").upsert(
+                    {"update_id": update_id, "received_at": datetime.now().isoformat()},
+                    on_conflict="update_id", ignore_duplicates=True).execute()
+        except Exception as e:
+            print(f"⚠️ Telegram Dedup Store Error: {e}")
+
+class TelegramLetterCache:
+    def __init__(self):
+        self.rows: Optional[List[Dict[str, Any]]] = None
+        self.loaded_at = 0.0
+
+    def get(self):
+        """(rows, segar?) atau (None, False) jika belum ada / terlalu basi."""
+        age = time.time() - self.loaded_at
+        if self.rows is None or age > TELEGRAM_CACHE_MAX_AGE: return None, False
+        return self.rows, age <= TELEGRAM_CACHE_TTL
+
+    def invalidate(self):
+        # Data berubah: tetap boleh dipakai (basi) tapi akan di-refresh pada perintah berikutnya
+        self.loaded_at = min(self.loaded_at, time.time() - TELEGRAM_CACHE_TTL - 1)
+
+    def refresh(self) -> List[Dict[str, Any]]:
+        def load():
+            # Dipaging: satu select dipotong di batas max-rows PostgREST (default 1000)
+            self.rows = fetch_letters_paged(TELEGRAM_LETTER_COLUMNS)
+            self.loaded_at = time.time()
+            return self.rows
+        return single_flight.do("sijagad:telegram:letters", load)
+
+def _md(text: Any) -> str:
+    # Escape karakter Markdown (legacy) agar nama vendor tidak merusak format pesan
+    return str(text).replace("_", "\\_").replace("*", "\\*").replace("`", "\\`").replace("[", "\\[")
+
+def _rupiah(n: int) -> str:
+    return "Rp " + f"{n:,}".replace(",", ".")
+
+def telegram_cmd_info(rows: List[Dict[str, Any]], arg: str) -> str:
+    return build_upcoming_report(rows, today_manado())
+
+def telegram_cmd_vendor(rows: List[Dict[str, Any]], arg: str) -> str:
+    keyword = arg.strip().lower()
+    if not keyword: return "ℹ️ Format: `/vendor <nama vendor>`"
+    found = [r for r in rows if keyword in str(r.get('vendor') or '').lower()]
+    if not found: return f"🔍 Tidak ada surat untuk vendor *{_md(arg.strip())}*."
+    found.sort(key=lambda r: str(r.get('tanggal_akhir_garansi') or ''))
+    lines = [f"🏢 *{_md(r.get('vendor'))}* — {_md(r.get('status') or '-')}\n   └ 📄 `{r.get('nomor_kontrak') or '-'}` | {_md(r.get('kategori') or '-')}\n   └ 💰 {_rupiah(int(float(r.get('nominal_jaminan') or 0)))} | ⏰ {r.get('tanggal_akhir_garansi') or '-'}"
+             for r in found[:10]]
+    footer = f"\n\n_(...dan {len(found) - 10} lainnya)_" if len(found) > 10 else ""
+    return f"🔍 *Hasil: {len(found)} surat*\n\n" + "\n".join(lines) + footer
+
+def telegram_cmd_kategori(rows: List[Dict[str, Any]], arg: str) -> str:
+    summary: Dict[str, Dict[str, int]] = {}
+    for r in rows:
+        k = str(r.get('kategori') or 'Lainnya')
+        item = summary.setdefault(k, {"total": 0, "aktif": 0, "expired": 0, "nominal": 0})
+        item["total"] += 1
+        status_lower = str(r.get('status') or '').lower()
+        if status_lower == "aktif": item["aktif"] += 1
+        elif status_lower == "expired": item["expired"] += 1
+        item["nominal"] += int(float(r.get('nominal_jaminan') or 0))
+    if not summary: return "📂 Belum ada data surat."
+    lines = [f"📂 *{_md(k)}*\n   └ {v['total']} surat (✅ {v['aktif']} aktif, ❌ {v['expired']} expired)\n   └ 💰 {_rupiah(v['nominal'])}"
+             for k, v in sorted(summary.items())]
+    return "📊 *RINGKASAN PER KATEGORI*\n\n" + "\n".join(lines)
+
+def telegram_cmd_help(rows: List[Dict[str, Any]], arg: str) -> str:
+    return ("🤖 *Perintah SiJAGAD Bot*\n"
+            "/info — surat yang jatuh tempo dalam 90 hari\n"
+            "/vendor <nama> — cari surat per vendor\n"
+            "/kategori — ringkasan per kategori jaminan\n"
+            "/help — daftar perintah")
+
+TELEGRAM_COMMANDS = {
+    "/start": telegram_cmd_info,
+    "/info": telegram_cmd_info,
+    "/vendor": telegram_cmd_vendor,
+    "/kategori": telegram_cmd_kategori,
+    "/help": telegram_cmd_help,
+}
+
+telegram_dedup = TelegramUpdateDedup(TELEGRAM_DEDUP_TTL)
+telegram_cache = TelegramLetterCache()
+
+def telegram_rows() -> Optional[List[Dict[str, Any]]]:
+    """Data surat untuk bot: cache jika segar, selain itu dimuat sekarang; cache basi jika gagal."""
+    rows, fresh = telegram_cache.get()
+    if fresh: return rows
+    try:
+        with call_timeout(TELEGRAM_LOAD_TIMEOUT):
+            return telegram_cache.refresh()
+    except Exception as e:
+        print(f"❌ Telegram Load Error: {e}")
+        return rows
+
+def parse_telegram_command(data: Dict[str, Any]) -> Optional[tuple]:
+    """(chat_id, command, arg) untuk pesan berisi perintah bot; None untuk pesan lain."""
+    message = data.get("message") or {}
+    if "text" not in message: return None
+    # "/info@NamaBot arg" -> ("/info", "arg")
+    head, _, arg = str(message["text"]).strip().partition(" ")
+    command = head.split("@")[0].lower()
+    if command not in TELEGRAM_COMMANDS: return None
+    sender = (message.get("from") or {}).get("first_name", "User")
+    print(f"📩 Menerima perintah '{command}' dari {sender}")
+    return str(message["chat"]["id"]), command, arg
+
+def build_telegram_reply(chat_id: str, command: str, arg: str) -> Dict[str, Any]:
+    rows = telegram_rows()
+    reply = TELEGRAM_COMMANDS[command](rows, arg) if rows is not None \
+        else "❌ Data sedang tidak bisa diambil, coba lagi sebentar lagi."
+    # Balasan langsung lewat body response webhook (Telegram mengeksekusinya sendiri)
+    return {"method": "sendMessage", "chat_id": chat_id, "text": reply, "parse_mode": "Markdown"}
+
+def handle_telegram_update(data: Dict[str, Any]) -> Dict[str, Any]:
+    # Obrolan grup biasa tidak dibalas, jadi tidak perlu dedup maupun dicatat
+    parsed = parse_telegram_command(data)
+    if parsed is None: return {"status": "ok"}
+    update_id = data.get("update_id")
+    if update_id is not None and telegram_dedup.seen_before(int(update_id)):
+        return {"status": "duplicate"}
+    reply = build_telegram_reply(*parsed)
+    if update_id is not None: telegram_dedup.mark_processed(int(update_id))
+    return reply
+
+
+
+# --- 3c. ANALITIK EXPOSURE (NUMPY) ---
+# Nilai jaminan yang jatuh tempo per minggu/bulan, dipecah per bank/jenis garansi.
+# Kolom yang dibutuhkan dimuat sekali ke array NumPy per versi data; setiap
+# kombinasi parameter dihitung dengan bincount (tanpa loop Python per surat)
+# dan hasilnya di-cache sampai data surat berubah.
+EXPOSURE_CACHE_TTL = float(os.getenv("EXPOSURE_CACHE_TTL") or 300)  # detik, batas umur data dari instance lain
+EXPOSURE_PAGE_SIZE = 1000
+EXPOSURE_GROUPS = ("bank_penerbit", "jenis_garansi", "kategori")
+EXPOSURE_MAX_HORIZON = {"week": 104, "month": 36}
+EXPOSURE_COLUMNS = "id, nominal_jaminan, tanggal_akhir_garansi, status, bank_penerbit, jenis_garansi, kategori"
+
+def fetch_letters_paged(columns: str, page_size: int = EXPOSURE_PAGE_SIZE) -> List[Dict[str, Any]]:
+    # PostgREST membatasi jumlah baris per response, jadi tabel besar diambil per halaman
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        res = get_db().table("letters").select(columns).eq("is_deleted", False) \
+            .order("id", desc=False).range(start, start + page_size - 1).execute()
+        page = cast(List[Dict[str, Any]], res.data or [])
+        rows.extend(page)
+        if len(page) < page_size: return rows
+        start += page_size
+
+class ExposureAnalytics:
+    def __init__(self):
+        self.version = 0
+        self.arrays: Optional[Dict[str, Any]] = None
+        self.loaded_version = -1
+        self.loaded_at = 0.0
+        self.results: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self.results = {}
+
+    def _load(self) -> Dict[str, Any]:
+        rows = fetch_letters_paged(EXPOSURE_COLUMNS)
+        dates = pd.to_datetime(pd.Series([r.get("tanggal_akhir_garansi") for r in rows], dtype=object), errors="coerce")
+        days = dates.to_numpy(dtype="datetime64[D]")
+        arrays: Dict[str, Any] = {
+            "day": days,
+            "valid": ~np.isnat(days),
+            "nominal": pd.to_numeric(pd.Series([r.get("nominal_jaminan") for r in rows], dtype=object), errors="coerce").fillna(0).to_numpy(dtype=np.float64),
+            "open": ~np.isin(np.array([str(r.get("status") or "") for r in rows], dtype=object), ["Expired", "Selesai"]),
+        }
+        for group in EXPOSURE_GROUPS:
+            labels, codes = np.unique(np.array([str(r.get(group) or "Lainnya") for r in rows], dtype=object), return_inverse=True)
+            arrays[group] = (labels, codes.astype(np.int64))
+        arrays["rows"] = len(rows)
+        return arrays
+
+    def frame(self) -> Dict[str, Any]:
+        with self._lock:
+            version = self.version
+            if self.arrays is not None and self.loaded_version == version and time.time() - self.loaded_at < EXPOSURE_CACHE_TTL:
+                return self.arrays
+        arrays = single_flight.do(f"sijagad:exposure:load:{version}", self._load)
+        with self._lock:
+            if self.arrays is not arrays:
+                self.arrays, self.loaded_version, self.loaded_at = arrays, version, time.time()
+                self.results = {}
+        return arrays
+
+    def compute(self, bucket: str, horizon: int, group_by: List[str], today) -> Dict[str, Any]:
+        arrays = self.frame()
+        key = (id(arrays), bucket, horizon, tuple(group_by), str(today))
+        with self._lock:
+            if key in self.results: return self.results[key]
+
+        day = arrays["day"]
+        today64 = np.datetime64(today, "D")
+        if bucket == "week":
+            # Minggu dimulai Senin; 1970-01-01 (epoch datetime64) adalah Kamis
+            start = today64 - ((today64.astype(np.int64) + 3) % 7)
+            index = (day - start).astype(np.int64) // 7
+            starts = start + np.arange(horizon + 1) * 7
+        else:
+            start_month = today64.astype("datetime64[M]")
+            index = (day.astype("datetime64[M]") - start_month).astype(np.int64)
+            starts = (start_month + np.arange(horizon + 1)).astype("datetime64[D]")
+        mask = arrays["valid"] & arrays["open"] & (index >= 0) & (index < horizon) & (day >= today64)
+
+        # Kode grup gabungan (mis. bank x jenis) dipadatkan ke 0..G-1
+        labels: List[str] = ["Semua"]
+        codes = np.zeros(arrays["rows"], dtype=np.int64)
+        for group in group_by:
+            group_labels, group_codes = arrays[group]
+            codes = codes * len(group_labels) + group_codes
+        if group_by:
+            present, codes_masked = np.unique(codes[mask], return_inverse=True)
+            labels = []
+            for code in present.tolist():
+                parts = []
+                for group in reversed(group_by):
+                    group_labels = arrays[group][0]
+                    code, part = divmod(code, len(group_labels))
+                    parts.append(str(group_labels[part]))
+                labels.append(" / ".join(reversed(parts)))
+        else:
+            codes_masked = codes[mask]
+
+        flat = codes_masked * horizon + index[mask]
+        size = len(labels) * horizon
+        nominal = np.bincount(flat, weights=arrays["nominal"][mask], minlength=size).reshape(len(labels), horizon)
+        count = np.bincount(flat, minlength=size).reshape(len(labels), horizon)
+        order = np.argsort(-nominal.sum(axis=1), kind="stable")
+
+        result = {
+            "bucket": bucket,
+            "horizon": horizon,
+            "group_by": group_by,
+            "as_of": str(today),
+            "buckets": [{"start": str(starts[i]), "end": str(starts[i + 1] - 1)} for i in range(horizon)],
+            "series": [{
+                "name": labels[g],
+                "nominal": nominal[g].astype(np.int64).tolist(),
+                "count": count[g].tolist(),
+                "total_nominal": int(nominal[g].sum()),
+                "total_count": int(count[g].sum()),
+            } for g in order],
+            "totals": {
+                "nominal": nominal.sum(axis=0).astype(np.int64).tolist(),
+                "count": count.sum(axis=0).tolist(),
+                "total_nominal": int(nominal.sum()),
+                "total_count": int(count.sum()),
+            },
+            "letters_scanned": arrays["rows"],
+        }
+        with self._lock:
+            self.results[key] = result
+        return result
+
+exposure_analytics = ExposureAnalytics()
+
+def mark_letters_changed(background_tasks: Optional[BackgroundTasks] = None):
+    """
+    Data surat berubah: cache bot, analitik exposure & snapshot laporan harus dihitung ulang.
+    Generasi baru langsung berlaku di instance ini; penyimpanannya ke store bersama
+    (untuk instance lain) dijalankan sebagai background task agar tidak menambah
+    round trip di jalur request.
+    """
+    telegram_cache.invalidate()
+    exposure_analytics.invalidate()
+    single_flight.forget("sijagad:analytics", "sijagad:export:excel")
+    report_generation.bump()
+    if background_tasks is not None: background_tasks.add_task(report_generation.publish)
+    else: report_generation.publish()
+
+
+# --- 3d. SNAPSHOT LAPORAN HARIAN ---
+# Cron malam menyimpan analitik, laporan H-90 dan Excel hari itu ke snapshot store
+# (Supabase Storage / disk lokal). Endpoint baca menyajikan file tersebut tanpa
+# full-table scan; ?fresh=true menghitung ulang dari database. Nama snapshot
+# memuat generasi data (objek sijagad/generation di store yang sama): setiap
+# perubahan surat membuat generasi baru, jadi snapshot dari perhitungan yang
+# sedang berjalan saat data berubah tersimpan di generasi lama dan tidak disajikan.
+XLSX_MEDIA_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+REPORT_SNAPSHOTS = {
+    "analytics": ("analytics.json", "application/json"),
+    "upcoming": ("upcoming.txt", "text/plain; charset=utf-8"),
+    "excel": ("laporan.xlsx", XLSX_MEDIA_TYPE),
+}
+
+SNAPSHOT_GENERATION = "sijagad/generation"
+SNAPSHOT_GENERATION_TTL = float(os.getenv("SNAPSHOT_GENERATION_TTL") or 5)  # detik, batas basi dari instance lain
+SNAPSHOT_PUBLISH_ATTEMPTS = 3
+
+class ReportGeneration:
+    """
+    Token generasi data surat di snapshot store, di-cache per proses selama
+    SNAPSHOT_GENERATION_TTL agar request baca tidak selalu menyentuh storage.
+    Generasi baru yang belum berhasil disimpan ke store membuat instance ini
+    berhenti menyajikan snapshot (instance lain belum tahu datanya berubah)
+    dan terus dicoba disimpan ulang.
+    """
+    def __init__(self, ttl: float = SNAPSHOT_GENERATION_TTL):
+        self.ttl = ttl
+        self.token: Optional[str] = None
+        self.read_at = 0.0
+        self.unpublished = False
+        self._lock = threading.Lock()
+
+    def current(self) -> str:
+        """Diambil SEBELUM menghitung laporan yang akan disimpan."""
+        with self._lock:
+            if self.token is not None and (self.unpublished or time.time() - self.read_at < self.ttl): return self.token
+        data = get_snapshot_store().get(SNAPSHOT_GENERATION)
+        with self._lock:
+            if not self.unpublished:
+                self.token, self.read_at = (data.decode("utf-8") if data else "0"), time.time()
+            return cast(str, self.token)
+
+    def bump(self) -> str:
+        token = uuid.uuid4().hex
+        with self._lock: self.token, self.unpublished = token, True
+        return token
+
+    def publish(self, attempts: int = SNAPSHOT_PUBLISH_ATTEMPTS) -> bool:
+        """Simpan generasi lokal ke store; False jika masih gagal (dicoba lagi pada akses berikutnya)."""
+        with self._lock:
+            if not self.unpublished: return True
+            token = cast(str, self.token)
+        for attempt in range(attempts):
+            try:
+                get_snapshot_store().put(SNAPSHOT_GENERATION, token.encode("utf-8"), "text/plain")
+            except Exception as e:
+                print(f"❌ Snapshot Invalidate Error ({attempt + 1}/{attempts}): {e}")
+                if attempt < attempts - 1: time.sleep(0.5 * (2 ** attempt))
+                continue
+            with self._lock:
+                if self.token == token: self.unpublished, self.read_at = False, time.time()
+            return True
+        return False
+
+    def servable(self) -> bool:
+        return self.publish(attempts=1)
+
+report_generation = ReportGeneration()
+
+def snapshot_generation() -> str:
+    return report_generation.current()
+
+def snapshot_name(kind: str, generation: str, day=None) -> str:
+    return f"sijagad/{(day or today_manado()).isoformat()}/{generation}/{REPORT_SNAPSHOTS[kind][0]}"
+
+def save_report_snapshot(kind: str, data: bytes, generation: str):
+    try:
+        get_snapshot_store().put(snapshot_name(kind, generation), data, REPORT_SNAPSHOTS[kind][1])
+    except Exception as e:
+        print(f"⚠️ Snapshot Write Error ({kind}): {e}")
+
+def load_report_snapshot(kind: str, response: Optional[Response] = None) -> Optional[bytes]:
+    if not report_generation.servable(): return None
+    data = get_snapshot_store().get(snapshot_name(kind, snapshot_generation()))
+    if data is not None and response is not None:
+        response.headers["X-Snapshot-Date"] = today_manado().isoformat()
+    return data
+
+def prune_report_snapshots() -> int:
+    """Dipanggil cron: hapus snapshot hari sebelumnya & generasi lama hari ini."""
+    store = get_snapshot_store()
+    try:
+        keep = f"sijagad/{today_manado().isoformat()}/{snapshot_generation()}/"
+        stale = [n for n in store.list("sijagad") if n != SNAPSHOT_GENERATION and not n.startswith(keep)]
+        store.delete(stale)
+        return len(stale)
+    except Exception as e:
+        print(f"⚠️ Snapshot Prune Error: {e}")
+        return 0
+
+def materialize_report_snapshots(upcoming_text: Optional[str] = None, generation: Optional[str] = None) -> List[str]:
+    """Dipanggil cron: hitung ulang & simpan semua laporan hari ini."""
+    jobs = {
+        "analytics": refresh_analytics_snapshot,
+        "upcoming": lambda: refresh_upcoming_snapshot(upcoming_text, generation),
+        "excel": build_excel_report,
+    }
+    built: List[str] = []
+    # Generasi yang belum tersimpan: snapshot baru tidak akan disajikan instance lain dengan benar
+    if not report_generation.publish(): return built
+    for kind, job in jobs.items():
+        try:
+            job()
+            built.append(REPORT_SNAPSHOTS[kind][0])
+        except Exception as e:
+            print(f"❌ Snapshot Build Error ({kind}): {e}")
+    return built
+
 # --- 4. MIDDLEWARE ---
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -157,6 +615,12 @@ async def add_process_time_header(request: Request, call_next):
     response = await call_next(request)
     return response
 
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    # Supabase tidak bisa diakses dan belum ada snapshot cache untuk endpoint ini
+    print(f"❌ Database Unavailable: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Database Offline"})
+
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
 
 
@@ -168,100 +632,117 @@ def read_root():
 
 # 🔥 ENDPOINT BARU: MENERIMA PESAN DARI TELEGRAM (WEBHOOK)
 @app.post("/telegram-webhook")
-async def telegram_webhook(request: Request, background_tasks: BackgroundTasks):
+async def telegram_webhook(request: Request):
     try:
         data = await request.json()
-        
-        # Cek apakah ini pesan teks
-        if "message" in data and "text" in data["message"]:
-            text = str(data["message"]["text"]).strip()
-            chat_id = str(data["message"]["chat"]["id"])
-            sender = data["message"]["from"].get("first_name", "User")
-
-            # LOGIKA COMMAND /info
-            if text == "/info" or text == "/start":
-                print(f"📩 Menerima perintah '{text}' dari {sender}")
-                
-                # Kirim status "Sedang mengetik..." (Opsional)
-                # Kita biarkan ini synchronous juga agar urut
-                requests.post(f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendChatAction", 
-                              json={"chat_id": chat_id, "action": "typing"})
-                
-                # Generate Laporan
-                report_msg = generate_upcoming_report_text()
-                
-                # 🔥 PERBAIKAN: KIRIM LANGSUNG (Direct Call)
-                # Jangan pakai background_tasks di sini untuk Vercel Webhook
-                send_telegram_notif(report_msg, chat_id)
-
-        return {"status": "ok"}
+        # Dedup menyentuh database, jadi dijalankan di threadpool agar event loop tidak terblokir
+        return await run_in_threadpool(handle_telegram_update, data)
     except Exception as e:
         print(f"Webhook Error: {e}")
         return {"status": "error"}
 
 @app.get("/api/check-upcoming")
-def manual_check_upcoming(background_tasks: BackgroundTasks):
+def manual_check_upcoming(background_tasks: BackgroundTasks, response: Response, fresh: bool = False):
     """Endpoint manual via Browser"""
-    msg = generate_upcoming_report_text()
+    snapshot = None if fresh else load_report_snapshot("upcoming", response)
+    msg = snapshot.decode("utf-8") if snapshot is not None else refresh_upcoming_snapshot()
     # Untuk manual trigger via browser, background task biasanya OK, 
     # tapi agar aman di Vercel, kita direct call juga
     send_telegram_notif(msg) 
     return {"status": "Sent", "preview": msg}
 
-@app.get("/api/analytics")
-def get_analytics_data():
-    try:
-        response = supabase.table("letters").select("*").eq("is_deleted", False).execute()
-        letters = cast(List[Dict[str, Any]], response.data or [])
-        
-        total_surat = len(letters)
-        total_nominal = sum([int(float(str(l.get("nominal_jaminan",0)))) for l in letters if l.get("nominal_jaminan")])
-        total_expired = len([l for l in letters if str(l.get("status")).lower() == "expired"])
-        
-        status_counts: Dict[str, int] = {}
-        vendor_stats: Dict[str, int] = {}
-        
-        for item in letters:
-            s = str(item.get("status", "Unknown"))
-            status_counts[s] = status_counts.get(s, 0) + 1
-            v = str(item.get("vendor", "Unknown"))
-            n = int(float(str(item.get("nominal_jaminan",0)))) if item.get("nominal_jaminan") else 0
-            vendor_stats[v] = vendor_stats.get(v, 0) + n
+def refresh_upcoming_snapshot(text: Optional[str] = None, generation: Optional[str] = None) -> str:
+    # `text` yang sudah dihitung pemanggil hanya dipakai bersama generasi saat ia dihitung
+    if text is None or generation is None: text, generation = None, snapshot_generation()
+    msg = text or generate_upcoming_report_text()
+    if not msg.startswith("❌"): save_report_snapshot("upcoming", msg.encode("utf-8"), generation)
+    return msg
+
+def compute_analytics() -> Dict[str, Any]:
+    res = get_db().table("letters").select("*").eq("is_deleted", False).execute()
+    letters = cast(List[Dict[str, Any]], res.data or [])
+    
+    total_surat = len(letters)
+    total_nominal = sum([int(float(str(l.get("nominal_jaminan",0)))) for l in letters if l.get("nominal_jaminan")])
+    total_expired = len([l for l in letters if str(l.get("status")).lower() == "expired"])
+    
+    status_counts: Dict[str, int] = {}
+    vendor_stats: Dict[str, int] = {}
+    
+    for item in letters:
+        s = str(item.get("status", "Unknown"))
+        status_counts[s] = status_counts.get(s, 0) + 1
+        v = str(item.get("vendor", "Unknown"))
+        n = int(float(str(item.get("nominal_jaminan",0)))) if item.get("nominal_jaminan") else 0
+        vendor_stats[v] = vendor_stats.get(v, 0) + n
 
-        pie_data = [{"name": k, "value": v, "color": "#10B981" if k=="Aktif" else "#EF4444"} for k, v in status_counts.items()]
-        bar_data = [{"name": k[:15]+"...", "total": v} for k, v in sorted(vendor_stats.items(), key=lambda x:x[1], reverse=True)[:5]]
+    pie_data = [{"name": k, "value": v, "color": "#10B981" if k=="Aktif" else "#EF4444"} for k, v in status_counts.items()]
+    bar_data = [{"name": k[:15]+"...", "total": v} for k, v in sorted(vendor_stats.items(), key=lambda x:x[1], reverse=True)[:5]]
 
-        return {"summary": {"total_surat": total_surat, "total_nominal": total_nominal, "total_expired": total_expired}, "pie_chart": pie_data, "bar_chart": bar_data}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return {"summary": {"total_surat": total_surat, "total_nominal": total_nominal, "total_expired": total_expired}, "pie_chart": pie_data, "bar_chart": bar_data}
+
+def refresh_analytics_snapshot() -> Dict[str, Any]:
+    generation = snapshot_generation()
+    data = compute_analytics()
+    save_report_snapshot("analytics", json.dumps(data, default=str).encode("utf-8"), generation)
+    return data
+
+@app.get("/api/analytics")
+def get_analytics_data(response: Response, fresh: bool = False):
+    snapshot = None if fresh else load_report_snapshot("analytics", response)
+    if snapshot is not None:
+        return Response(content=snapshot, media_type="application/json", headers={"X-Snapshot-Date": response.headers["X-Snapshot-Date"]})
+    # Request identik yang bersamaan berbagi satu full-table scan (dan satu penulisan snapshot)
+    return read_coalesced("sijagad:analytics", refresh_analytics_snapshot, response)
+
+@app.get("/api/analytics/exposure")
+def get_exposure_analytics(response: Response, bucket: str = "month", horizon: int = 12, group_by: str = "bank_penerbit"):
+    """Nominal & jumlah jaminan yang jatuh tempo per minggu/bulan ke depan, per grup."""
+    if bucket not in EXPOSURE_MAX_HORIZON: raise HTTPException(400, "bucket harus 'week' atau 'month'")
+    horizon = max(1, min(horizon, EXPOSURE_MAX_HORIZON[bucket]))
+    groups = [g.strip() for g in group_by.split(",") if g.strip() and g.strip() != "none"]
+    invalid = [g for g in groups if g not in EXPOSURE_GROUPS]
+    if invalid or len(groups) > 2: raise HTTPException(400, f"group_by maksimal 2 dari: {', '.join(EXPOSURE_GROUPS)}")
+    key = f"sijagad:exposure:{bucket}:{horizon}:{','.join(groups)}"
+    # Versi data di key single-flight: hasil sebelum mark_letters_changed tidak dipakai ulang
+    return read_coalesced(key, lambda: exposure_analytics.compute(bucket, horizon, groups, today_manado()), response,
+                          flight_key=f"{key}:v{exposure_analytics.version}")
 
 @app.get("/letters/active")
-def get_active_letters():
-    return supabase.table("letters").select("*").eq("is_deleted", False).neq("status", "Expired").neq("status", "Selesai").order("id", desc=True).execute().data or []
+def get_active_letters(response: Response):
+    return read_with_fallback("sijagad:letters:active", lambda: get_db().table("letters").select("*").eq("is_deleted", False).neq("status", "Expired").neq("status", "Selesai").order("id", desc=True).execute().data or [], response)
 
 @app.get("/letters/archive")
-def get_archived_letters():
-    return supabase.table("letters").select("*").eq("is_deleted", False).or_("status.eq.Expired,status.eq.Selesai").order("id", desc=True).execute().data or []
+def get_archived_letters(response: Response):
+    return read_with_fallback("sijagad:letters:archive", lambda: get_db().table("letters").select("*").eq("is_deleted", False).or_("status.eq.Expired,status.eq.Selesai").order("id", desc=True).execute().data or [], response)
 
 @app.get("/letters")
-def get_all_letters():
-    return supabase.table("letters").select("*").eq("is_deleted", False).order("id", desc=True).execute().data or []
+def get_all_letters(response: Response):
+    return read_with_fallback("sijagad:letters:all", lambda: get_db().table("letters").select("*").eq("is_deleted", False).order("id", desc=True).execute().data or [], response)
 
 @app.get("/letters/{letter_id}")
 def get_letter_by_id(letter_id: int):
-    res = supabase.table("letters").select("*").eq("id", letter_id).single().execute()
-    if not res.data: raise HTTPException(404)
-    return res.data
+    # Lookup satu baris tidak disimpan sebagai snapshot (satu key per id = cache tanpa batas)
+    rows = read_with_fallback(None, lambda: get_db().table("letters").select("*").eq("id", letter_id).limit(1).execute().data or [])
+    if not rows: raise HTTPException(404)
+    return rows[0]
+
+@app.get("/health")
+def health_check(response: Response):
+    result = probe(lambda: get_db().table("letters").select("id").limit(1).execute())
+    if result["database"] != "ok": response.status_code = 503
+    return result
 
 @app.post("/letters")
 def create_letter(letter: LetterSchema, background_tasks: BackgroundTasks):
-    data = letter.dict(); user = data.pop("user_email", "Admin")
+    data = letter.dict(); user = data.pop("user_email", "Admin"); data.pop("version", None)
     if "id" in data: del data["id"]
     data["is_deleted"] = False
     data["vendor"] = sanitize_text(data["vendor"])
     data["pekerjaan"] = sanitize_text(data["pekerjaan"])
-    res = supabase.table("letters").insert(data).execute()
+    res = get_db().table("letters").insert(data).execute()
     if res.data:
+        mark_letters_changed(background_tasks)
         background_tasks.add_task(log_activity_bg, user, "CREATE", f"Tambah: {data['vendor']}")
         msg = f"🆕 *DATA BARU*\n🏢 {data['vendor']}\n📄 `{data['nomor_kontrak']}`"
         # Untuk notifikasi create, background tasks biasanya OK karena user interaksi via frontend
@@ -270,125 +751,205 @@ def create_letter(letter: LetterSchema, background_tasks: BackgroundTasks):
 
 @app.put("/letters/{letter_id}")
 def update_letter(letter_id: int, letter: LetterSchema, background_tasks: BackgroundTasks):
-    data = letter.dict(); user = data.pop("user_email", "Admin")
+    data = letter.dict(); user = data.pop("user_email", "Admin"); version = data.pop("version", None)
     if "id" in data: del data["id"]
     data["vendor"] = sanitize_text(data["vendor"])
     data["pekerjaan"] = sanitize_text(data["pekerjaan"])
-    res = supabase.table("letters").update(data).eq("id", letter_id).execute()
+    # Optimistic concurrency: hanya berhasil jika belum diubah user lain sejak form dibuka
+    if version is not None: data["version"] = version + 1
+    query = get_db().table("letters").update(data).eq("id", letter_id)
+    if version is not None: query = query.eq("version", version)
+    # Baris hasil update dikembalikan langsung (return=representation), tanpa select ulang
+    res = query.execute()
+    rows = cast(List[Dict[str, Any]], res.data or [])
+    if not rows:
+        if version is not None: raise HTTPException(409, "Data sudah diubah atau dihapus user lain, muat ulang data")
+        raise HTTPException(404, "Data tidak ditemukan")
+    mark_letters_changed(background_tasks)
     background_tasks.add_task(log_activity_bg, user, "UPDATE", f"Edit: {data['vendor']}")
-    return {"status": "success"}
+    return {"status": "success", "data": rows[0]}
 
 @app.delete("/letters/{letter_id}")
-def delete_letter(letter_id: int, background_tasks: BackgroundTasks, user_email: str = "Admin"):
-    # Fix Cast
-    exist = supabase.table("letters").select("vendor").eq("id", letter_id).execute()
-    d_list = cast(List[Dict[str, Any]], exist.data or [])
-    target = str(d_list[0].get('vendor', 'Unknown')) if d_list else "Unknown"
-    supabase.table("letters").update({"is_deleted": True}).eq("id", letter_id).execute()
-    background_tasks.add_task(log_activity_bg, user_email, "SOFT_DELETE", f"Hapus: {target}")
+def delete_letter(letter_id: int, background_tasks: BackgroundTasks, user_email: str = "Admin", version: Optional[int] = None):
+    db = get_db()
+    try:
+        # Soft delete + log aktivitas dalam satu transaksi (lihat sql/letters_mutations.sql)
+        res = db.rpc("soft_delete_letter", {"p_letter_id": letter_id, "p_user_email": user_email, "p_version": version}).execute()
+        logged = True
+    except Exception as e:
+        # Fallback hanya jika fungsi belum dipasang: update yang mengembalikan vendor, log di background
+        if not is_missing_function(e): raise
+        print("⚠️ RPC soft_delete_letter belum dipasang, pakai fallback")
+        query = db.table("letters").update({"is_deleted": True}).eq("id", letter_id)
+        if version is not None: query = query.eq("version", version)
+        res = query.execute()
+        logged = False
+    rows = cast(List[Dict[str, Any]], res.data or [])
+    if not rows:
+        if version is not None: raise HTTPException(409, "Data sudah diubah atau dihapus user lain, muat ulang data")
+        raise HTTPException(404, "Data tidak ditemukan")
+    mark_letters_changed(background_tasks)
+    if not logged:
+        target = str(rows[0].get('vendor') or 'Unknown')
+        background_tasks.add_task(log_activity_bg, user_email, "SOFT_DELETE", f"Hapus: {target}")
     return {"status": "success"}
 
 @app.get("/api/cron-update-status")
 def cron_auto_update_status(background_tasks: BackgroundTasks):
-    # Gunakan fungsi generate report yang sudah kita buat
-    report = generate_upcoming_report_text()
-    
     # Logic update expired database
     tz = pytz.timezone('Asia/Makassar'); today = datetime.now(tz).strftime('%Y-%m-%d')
-    res = supabase.table("letters").select("id").eq("is_deleted", False).lt("tanggal_akhir_garansi", today).neq("status", "Expired").neq("status", "Selesai").execute()
+    # Satu update bersyarat; baris yang berubah dikembalikan, tidak perlu select + update per baris
+    res = get_db().table("letters").update({"status": "Expired"}).eq("is_deleted", False).lt("tanggal_akhir_garansi", today).neq("status", "Expired").neq("status", "Selesai").execute()
     lst = cast(List[Dict[str, Any]], res.data or [])
-    for x in lst:
-        if x.get('id'): supabase.table("letters").update({"status": "Expired"}).eq("id", x['id']).execute()
+    # Generasi baru disimpan ke store oleh materialize_report_snapshots di bawah, sebelum membangun snapshot
+    if lst: mark_letters_changed(background_tasks)
+
+    # Gunakan fungsi generate report yang sudah kita buat
+    # (dihitung setelah update expired, di generasi data yang sudah baru)
+    generation = snapshot_generation()
+    report = generate_upcoming_report_text()
     
     # Kirim report ke Default Group (Hanya saat pagi hari via Cron)
     # Cron Vercel punya timeout lebih panjang, jadi direct call lebih aman
     if "Sisa:" in report: 
         send_telegram_notif(report)
         
+    # Laporan hari ini dihitung sekali di sini; endpoint baca cukup menyajikan snapshot
+    snapshots = materialize_report_snapshots(report if not report.startswith("❌") else None, generation)
+    pruned = prune_report_snapshots()
     background_tasks.add_task(log_activity_bg, "System", "AUTO_UPDATE", f"Check done. {len(lst)} updated.")
     
-    return {"status": "success"}
+    return {"status": "success", "snapshots": snapshots, "snapshots_pruned": pruned}
 
-@app.get("/export/excel")
-def export_excel_multisheet():
-    try:
-        template_path = os.path.join(os.path.dirname(__file__), "Template_Sijagad.xlsx")
-        
-        if not os.path.exists(template_path):
-             raise HTTPException(status_code=404, detail="Template tidak ditemukan.")
+# Banyak user membuka export bersamaan (pagi hari): cukup satu build, hasilnya dibagi
+@coalesce(key=lambda: "sijagad:export:excel")
+def build_excel_report() -> bytes:
+    template_path = os.path.join(os.path.dirname(__file__), "Template_Sijagad.xlsx")
+    
+    if not os.path.exists(template_path):
+         raise HTTPException(status_code=404, detail="Template tidak ditemukan.")
 
-        wb = load_workbook(template_path)
+    wb = load_workbook(template_path)
 
-        if "PELAKSANAAN" not in wb.sheetnames or "PEMELIHARAAN" not in wb.sheetnames:
-            raise HTTPException(status_code=500, detail="Template salah format.")
+    if "PELAKSANAAN" not in wb.sheetnames or "PEMELIHARAAN" not in wb.sheetnames:
+        raise HTTPException(status_code=500, detail="Template salah format.")
 
-        ws_pelaksanaan = wb["PELAKSANAAN"]
-        ws_pemeliharaan = wb["PEMELIHARAAN"]
+    ws_pelaksanaan = wb["PELAKSANAAN"]
+    ws_pemeliharaan = wb["PEMELIHARAAN"]
 
-        response = supabase.table("letters").select("*").eq("is_deleted", False).order("id", desc=True).execute()
-        data = response.data or []
-        
-        if not data:
-             output = BytesIO()
-             wb.save(output)
-             output.seek(0)
-             filename = f"Laporan_SiJAGAD_{datetime.now().strftime('%Y%m%d')}.xlsx"
-             return StreamingResponse(output, headers={'Content-Disposition': f'attachment; filename="{filename}"'}, media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
-        df = pd.DataFrame(data)
-        df['kategori'] = df['kategori'].astype(str).str.strip()
-
-        data_pelaksanaan = cast(List[Dict[str, Any]], df[df['kategori'].str.contains('Pelaksanaan', case=False, na=False)].to_dict('records'))
-        data_pemeliharaan = cast(List[Dict[str, Any]], df[df['kategori'].str.contains('Pemeliharaan', case=False, na=False)].to_dict('records'))
-
-        thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-
-        def fill_sheet(worksheet, data_list: List[Dict[str, Any]]):
-            row_idx = 2 
-            for i, item in enumerate(data_list, start=1):
-                get_val = lambda key: str(item.get(key) if item.get(key) is not None else '-')
-                get_nominal = lambda key: int(float(str(item.get(key, 0)))) if item.get(key) else 0
-
-                worksheet.cell(row=row_idx, column=1, value=i)
-                worksheet.cell(row=row_idx, column=2, value=get_val('vendor'))
-                worksheet.cell(row=row_idx, column=3, value=get_val('pekerjaan'))
-                worksheet.cell(row=row_idx, column=4, value=get_val('nomor_kontrak'))
-                worksheet.cell(row=row_idx, column=5, value=get_val('tanggal_awal_kontrak'))
-                
-                cell_f = worksheet.cell(row=row_idx, column=6, value=get_nominal('nominal_jaminan'))
-                cell_f.number_format = '#,##0' 
-                
-                worksheet.cell(row=row_idx, column=7, value=get_val('jenis_garansi'))
-                worksheet.cell(row=row_idx, column=8, value=get_val('nomor_garansi'))
-                worksheet.cell(row=row_idx, column=9, value=get_val('bank_penerbit'))
-                worksheet.cell(row=row_idx, column=10, value=get_val('tanggal_awal_garansi'))
-                worksheet.cell(row=row_idx, column=11, value=get_val('tanggal_akhir_garansi'))
-                worksheet.cell(row=row_idx, column=12, value="")
-                worksheet.cell(row=row_idx, column=13, value="") 
-
-                for col_num in range(1, 14):
-                    worksheet.cell(row=row_idx, column=col_num).border = thin_border
-                
-                row_idx += 1
-
-        fill_sheet(ws_pelaksanaan, data_pelaksanaan)
-        fill_sheet(ws_pemeliharaan, data_pemeliharaan)
-
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
+    generation = snapshot_generation()
+    response = read_with_fallback(None, lambda: get_db().table("letters").select("*").eq("is_deleted", False).order("id", desc=True).execute())
+    data = response.data or []
+    
+    if not data:
+         output = BytesIO()
+         wb.save(output)
+         return output.getvalue()
+
+    df = pd.DataFrame(data)
+    df['kategori'] = df['kategori'].astype(str).str.strip()
+
+    data_pelaksanaan = cast(List[Dict[str, Any]], df[df['kategori'].str.contains('Pelaksanaan', case=False, na=False)].to_dict('records'))
+    data_pemeliharaan = cast(List[Dict[str, Any]], df[df['kategori'].str.contains('Pemeliharaan', case=False, na=False)].to_dict('records'))
+
+    thin_border = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+
+    def fill_sheet(worksheet, data_list: List[Dict[str, Any]]):
+        row_idx = 2 
+        for i, item in enumerate(data_list, start=1):
+            get_val = lambda key: str(item.get(key) if item.get(key) is not None else '-')
+            get_nominal = lambda key: int(float(str(item.get(key, 0)))) if item.get(key) else 0
+
+            worksheet.cell(row=row_idx, column=1, value=i)
+            worksheet.cell(row=row_idx, column=2, value=get_val('vendor'))
+            worksheet.cell(row=row_idx, column=3, value=get_val('pekerjaan'))
+            worksheet.cell(row=row_idx, column=4, value=get_val('nomor_kontrak'))
+            worksheet.cell(row=row_idx, column=5, value=get_val('tanggal_awal_kontrak'))
+            
+            cell_f = worksheet.cell(row=row_idx, column=6, value=get_nominal('nominal_jaminan'))
+            cell_f.number_format = '#,##0' 
+            
+            worksheet.cell(row=row_idx, column=7, value=get_val('jenis_garansi'))
+            worksheet.cell(row=row_idx, column=8, value=get_val('nomor_garansi'))
+            worksheet.cell(row=row_idx, column=9, value=get_val('bank_penerbit'))
+            worksheet.cell(row=row_idx, column=10, value=get_val('tanggal_awal_garansi'))
+            worksheet.cell(row=row_idx, column=11, value=get_val('tanggal_akhir_garansi'))
+            worksheet.cell(row=row_idx, column=12, value="")
+            worksheet.cell(row=row_idx, column=13, value="") 
+
+            for col_num in range(1, 14):
+                worksheet.cell(row=row_idx, column=col_num).border = thin_border
+            
+            row_idx += 1
+
+    fill_sheet(ws_pelaksanaan, data_pelaksanaan)
+    fill_sheet(ws_pemeliharaan, data_pemeliharaan)
 
+    output = BytesIO()
+    wb.save(output)
+    content = output.getvalue()
+    save_report_snapshot("excel", content, generation)
+    return content
+
+@app.get("/export/excel")
+def export_excel_multisheet(fresh: bool = False):
+    try:
+        headers = {}
+        content = None if fresh else load_report_snapshot("excel")
+        if content is not None:
+            headers["X-Snapshot-Date"] = today_manado().isoformat()
+        else:
+            content = build_excel_report()
         filename = f"Laporan_SiJAGAD_{datetime.now().strftime('%Y%m%d')}.xlsx"
+        headers['Content-Disposition'] = f'attachment; filename="{filename}"'
         return StreamingResponse(
-            output, 
-            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
-            media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            BytesIO(content), 
+            headers=headers,
+            media_type=XLSX_MEDIA_TYPE
         )
 
+    except DatabaseUnavailable: raise
     except Exception as e:
         print(f"Export Error: {e}")
         raise HTTPException(status_code=500, detail=f"Gagal export: {str(e)}")
 
 @app.get("/logs")
 def get_logs():
-    return supabase.table("activity_sijagad").select("*").order("created_at", desc=True).limit(50).execute().data or []
\ No newline at end of file
+    return get_db().table("activity_sijagad").select("*").order("created_at", desc=True).limit(50).execute().data or []
+
+# --- LOG AKTIVITAS: RIWAYAT, ROLLUP & RETENSI ---
+# Entri lebih tua dari SIPRIMA_LOG_RETENTION_DAYS dipindah ke arsip + rollup harian
+# (lihat siprima_core/retention.py dan sql/activity_retention.sql)
+LOG_HISTORY_MAX_LIMIT = 500
+LOG_DAILY_MAX_DAYS = 366
+
+@app.get("/logs/history")
+def get_logs_history(start: Optional[str] = None, end: Optional[str] = None, user_email: Optional[str] = None,
+                     action: Optional[str] = None, limit: int = 50, before: Optional[str] = None):
+    try:
+        start_day, end_day = parse_day(start), parse_day(end)
+    except ValueError:
+        raise HTTPException(400, "Format tanggal harus YYYY-MM-DD")
+    limit = max(1, min(limit, LOG_HISTORY_MAX_LIMIT))
+    return query_logs(get_db(), "activity_sijagad", start_day, end_day, {"user_email": user_email, "action": action}, limit, before)
+
+@app.get("/logs/daily")
+def get_logs_daily(start: str, end: Optional[str] = None):
+    try:
+        start_day: Any = parse_day(start)
+        end_day: Any = parse_day(end, today_manado() + timedelta(days=1))
+    except ValueError:
+        raise HTTPException(400, "Format tanggal harus YYYY-MM-DD")
+    if (end_day - start_day).days > LOG_DAILY_MAX_DAYS: raise HTTPException(400, f"Rentang maksimal {LOG_DAILY_MAX_DAYS} hari")
+    return daily_counts(get_db(), "activity_sijagad", start_day, end_day)
+
+@app.get("/api/cron-compact-logs")
+def cron_compact_logs(authorization: Optional[str] = Header(None)):
+    # Menghapus data: hanya untuk Vercel Cron (Authorization: Bearer <CRON_SECRET>)
+    if not cron_authorized(authorization): raise HTTPException(401, "Unauthorized")
+    try:
+        summary = compact_logs(get_db(), "activity_sijagad", today=today_manado())
+    except ArchiveUnavailable as e:
+        raise HTTPException(503, str(e))
+    print(f"🗄️ [Retensi] {summary['archived']} log diarsipkan ({len(summary['days'])} hari)")
+    return summary
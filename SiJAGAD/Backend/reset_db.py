@@ -1,19 +1,18 @@
-import os
-from dotenv import load_dotenv
-from supabase import create_client
+from pathlib import Path
+
+from siprima_core import get_supabase, load_env, use_credentials
 
 # 1. Load Environment Variables
-load_dotenv()
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+load_env(Path(__file__).resolve().parent / '.env')
+use_credentials("SUPABASE_URL", "SUPABASE_SERVICE_KEY")
+
+# 2. Koneksi ke Supabase (client bersama dari siprima_core)
+supabase = get_supabase()
 
-if not SUPABASE_URL or not SUPABASE_KEY:
+if supabase is None:
     print("❌ Error: Pastikan file .env sudah benar!")
     exit()
 
-# 2. Koneksi ke Supabase
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 def wipe_database():
     print("⚠️  PERINGATAN: Ini akan MENGHAPUS SEMUA DATA SURAT di Database!")
     confirm = input("Ketik 'Y' jika Anda yakin ingin menghapus semua data: ")
@@ -3,34 +3,31 @@ import time
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from supabase import create_client, Client
 import os
-from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from pathlib import Path
 
 # --- 1. LOAD ENV SECARA ROBUST ---
+from siprima_core import get_supabase, load_env, use_credentials
+
 env_path = Path(__file__).parent / '.env'
-load_dotenv(dotenv_path=env_path)
+load_env(env_path)
+use_credentials("SUPABASE_URL", "SUPABASE_SERVICE_KEY")
 
 print(f"📂 Lokasi Script: {Path(__file__).parent}")
 print(f"📂 Mencari .env di: {env_path}")
 
-# --- 2. FIX PYLANCE: Supabase Config ---
-# Kita paksa tipe datanya menjadi string (: str) dan beri nilai default ""
-SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
-SUPABASE_KEY: str = os.getenv("SUPABASE_SERVICE_KEY", "")
+# --- 2. Supabase Config ---
+# Client bersama dari siprima_core (lazy, pool keep-alive, timeout & retry)
+supabase = get_supabase()
 
 # Validasi Manual
-if not SUPABASE_URL or not SUPABASE_KEY:
+if supabase is None:
     print("❌ ERROR: Supabase URL/Key kosong! Cek file .env Anda.")
     exit()
 else:
     print("✅ SUCCESS: Supabase Env terbaca!")
 
-# Setup Supabase (Sekarang Pylance sudah senang karena variabel pasti string)
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-
 # --- 3. FIX PYLANCE: Email Config ---
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
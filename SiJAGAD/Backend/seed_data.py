@@ -1,9 +1,10 @@
 import pandas as pd
-import requests
 import math
 import os
 from datetime import datetime
 
+from siprima_core import get_http_client
+
 # --- KONFIGURASI ---
 API_URL = "http://localhost:8000/letters"
 TARGET_FILE = "DATA_MASTER.xlsx"
@@ -104,7 +105,8 @@ def import_sheet(df, kategori_fix):
         }
 
         try:
-            response = requests.post(API_URL, json=payload)
+            # Pakai client keep-alive bersama agar tiap baris tidak membuka koneksi baru
+            response = get_http_client().post(API_URL, json=payload)
             if response.status_code == 200:
                 print(f"   ✅ [OK] {vendor}")
                 success_count += 1
@@ -0,0 +1,23 @@
+-- Retensi log aktivitas: rollup harian per user per aksi untuk entri yang sudah
+-- dipindah ke arsip (lihat siprima_core/retention.py).
+-- Jalankan sekali di Supabase SQL Editor.
+
+create table if not exists public.activity_daily_rollups (
+    source text not null,          -- nama tabel log asal
+    day date not null,
+    user_email text not null,
+    action text not null,
+    count integer not null,
+    primary key (source, day, user_email, action)
+);
+
+-- Kompaksi mencari entri tertua & mengambil per hari berdasarkan created_at
+create index if not exists activity_sijagad_created_idx
+    on public.activity_sijagad (created_at);
+
+-- Bucket privat untuk arsip JSONL ter-gzip (SIPRIMA_ARCHIVE_STORE=storage,
+-- SIPRIMA_ARCHIVE_BUCKET). Backend SiJAGAD memakai service key, jadi tidak butuh
+-- policy storage tambahan.
+insert into storage.buckets (id, name, public)
+values ('log-archive', 'log-archive', false)
+on conflict (id) do nothing;
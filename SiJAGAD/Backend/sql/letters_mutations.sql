@@ -0,0 +1,44 @@
+-- Jalur tulis tabel letters: versi baris (optimistic concurrency) dan
+-- soft delete + log aktivitas dalam satu round trip untuk DELETE /letters/{id}.
+-- Jalankan sekali di Supabase SQL Editor.
+
+alter table public.letters add column if not exists version integer not null default 1;
+
+-- Setiap update menaikkan versi, termasuk update dari luar API (mis. SQL Editor)
+create or replace function public.bump_row_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.version := old.version + 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists letters_bump_version on public.letters;
+create trigger letters_bump_version
+    before update on public.letters
+    for each row execute function public.bump_row_version();
+
+-- p_version null = tanpa cek versi (client lama)
+create or replace function public.soft_delete_letter(p_letter_id bigint, p_user_email text default 'Admin', p_version integer default null)
+returns setof public.letters
+language plpgsql
+as $$
+declare
+    deleted public.letters;
+begin
+    update public.letters
+    set is_deleted = true
+    where id = p_letter_id
+      and (p_version is null or version = p_version)
+    returning * into deleted;
+
+    if not found then return; end if;
+
+    insert into public.activity_sijagad (user_email, action, target, created_at)
+    values (p_user_email, 'SOFT_DELETE', 'Hapus: ' || coalesce(deleted.vendor, 'Unknown'), now());
+
+    return next deleted;
+end;
+$$;
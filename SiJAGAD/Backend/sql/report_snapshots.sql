@@ -0,0 +1,7 @@
+-- Bucket privat untuk snapshot laporan harian (analitik, laporan H-90, Excel)
+-- yang dibaca bersama semua instance (SIPRIMA_SNAPSHOT_STORE=storage, default).
+-- Jalankan sekali di Supabase SQL Editor.
+
+insert into storage.buckets (id, name, public)
+values ('snapshots', 'snapshots', false)
+on conflict (id) do nothing;
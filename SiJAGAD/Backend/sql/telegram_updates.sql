@@ -0,0 +1,11 @@
+-- Catatan update_id Telegram yang sudah diproses, agar retry webhook
+-- (dari instance mana pun) tidak menghasilkan balasan ganda.
+-- Jalankan sekali di Supabase SQL Editor.
+
+create table if not exists public.telegram_updates (
+    update_id bigint primary key,
+    received_at timestamptz not null default now()
+);
+
+-- Opsional: bersihkan catatan lama (mis. via pg_cron harian)
+-- delete from public.telegram_updates where received_at < now() - interval '2 days';
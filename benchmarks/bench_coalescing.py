@@ -0,0 +1,70 @@
+"""
+Uji konkurensi single-flight untuk endpoint mahal (/api/analytics,
+/export/excel, /api/dashboard/stats).
+
+Kedua app FastAPI dijalankan in-process dengan stand-in database lokal yang
+lambat (setiap query `select` tidur --latency ms, mensimulasikan full-table
+scan). N request identik dikirim bersamaan; tanpa coalescing akan ada N scan,
+dengan coalescing seharusnya hanya 1 scan per gelombang.
+
+Pemakaian:
+    python benchmarks/bench_coalescing.py --concurrency 50 --latency 300
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+import siprima_core  # noqa: E402
+from standin import StandInSupabase, load_apps, sample_assets, sample_letters  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+def wave(client: TestClient, path: str, concurrency: int):
+    barrier = threading.Barrier(concurrency)
+
+    def hit():
+        barrier.wait()
+        r = client.get(path)
+        return r.status_code, r.content
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: hit(), range(concurrency)))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=300, help="Latency query stand-in (ms)")
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+
+    db = StandInSupabase(latency=args.latency / 1000)
+    db.tables["letters"] = sample_letters(args.rows)
+    db.tables["attb_assets"] = sample_assets(args.rows)
+    siprima_core.set_supabase(db)
+    sijagad, attb = load_apps()
+
+    failures = 0
+    # fresh=true: lewati snapshot harian agar yang diuji benar-benar scan ke database
+    for app, path in ((sijagad, "/api/analytics?fresh=true"), (sijagad, "/export/excel?fresh=true"), (attb, "/api/dashboard/stats")):
+        with TestClient(app) as client:
+            db.reset_counters()
+            t0 = time.perf_counter()
+            results = wave(client, path, args.concurrency)
+            elapsed = time.perf_counter() - t0
+            # Baca generasi / tulis snapshot di storage bukan scan database
+            scans = sum(n for table, n in db.calls_by_table.items() if not table.startswith("storage:"))
+            ok = all(code == 200 for code, _ in results)
+            same = len({body for _, body in results}) == 1
+            failures += int(not (ok and same and scans == 1))
+            print(f"{path:22s} {args.concurrency} request  {elapsed * 1000:7.0f} ms  scan DB: {scans:3d}  "
+                  f"semua 200: {ok}  hasil identik: {same}")
+    print(f"single-flight: {siprima_core.single_flight.stats()}")
+    sys.exit(1 if failures else 0)
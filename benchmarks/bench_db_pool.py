@@ -0,0 +1,97 @@
+"""
+Benchmark latency round trip ke Supabase: pool dingin vs pool hangat.
+
+- cold : setiap request memakai httpx.Client baru (koneksi + TLS dibuka ulang),
+         sama seperti pola requests.post() / create_client() per proses.
+- warm : semua request lewat client bersama siprima_core (keep-alive, HTTP/2).
+
+Target default diambil dari SUPABASE_URL / SUPABASE_SERVICE_KEY di .env SiJAGAD
+(query ringan `select=id&limit=1`). Tanpa kredensial, benchmark memakai
+server HTTP lokal sebagai stand-in (tanpa TLS, jadi selisihnya lebih kecil).
+
+Pemakaian:
+    python benchmarks/bench_db_pool.py --requests 50 --table letters
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+import httpx  # noqa: E402
+from siprima_core import get_http_client, load_env  # noqa: E402
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'[{"id":1}]'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def measure(fn, n: int):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def report(label: str, samples):
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(f"{label:6s} n={len(samples):4d}  mean {statistics.mean(samples):7.2f} ms  "
+          f"p50 {statistics.median(samples):7.2f} ms  p95 {p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--table", default="letters")
+    parser.add_argument("--local", action="store_true", help="Paksa pakai stand-in lokal")
+    args = parser.parse_args()
+
+    load_env(Path(__file__).resolve().parents[1] / "SiJAGAD" / "Backend" / ".env")
+    base, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_SERVICE_KEY")
+    if args.local or not base or not key:
+        base, key = start_stand_in(), "local"
+        print(f"🧪 Stand-in lokal: {base}")
+    else:
+        print(f"🌐 Supabase: {base}")
+
+    url = f"{base.rstrip('/')}/rest/v1/{args.table}"
+    params = {"select": "id", "limit": "1"}
+    headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+
+    def cold():
+        with httpx.Client() as client:
+            client.get(url, params=params, headers=headers).raise_for_status()
+
+    pooled = get_http_client()
+
+    def warm():
+        pooled.get(url, params=params, headers=headers).raise_for_status()
+
+    warm()  # buka koneksi pool sekali sebelum pengukuran
+    report("cold", measure(cold, args.requests))
+    report("warm", measure(warm, args.requests))
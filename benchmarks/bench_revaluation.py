@@ -0,0 +1,113 @@
+"""
+Benchmark revaluasi harga_tafsiran ATTB (preview + apply) pada data besar.
+
+Stand-in lokal diisi N aset dengan rate lama, lalu rate baru diterapkan lewat
+POST /api/assets/revaluation/apply. Fungsi RPC revalue_assets
+(sql/revaluation.sql) ditiru: update aset + satu log REVALUATION per aset.
+Diukur waktu preview dan apply (dipisah dari porsi paging stand-in), jumlah
+round trip, dan dicek bahwa harga baru = int(konversi_kg * rate) serta setiap
+aset yang berubah punya tepat satu log. Skenario kedua menggagalkan satu chunk
+di tengah dan memastikan respons 500 melaporkan progres chunk yang sudah masuk.
+
+Pemakaian:
+    python benchmarks/bench_revaluation.py --rows 100000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+import siprima_core  # noqa: E402
+from standin import StandInSupabase, load_apps, sample_assets  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+def make_rpc_revalue_assets(fail_on_call: int = 0):
+    calls = {"n": 0}
+
+    def rpc_revalue_assets(db: StandInSupabase, params):
+        # Tiruan public.revalue_assets (monitoring-attb/Backend/sql/revaluation.sql)
+        calls["n"] += 1
+        if calls["n"] == fail_on_call: raise RuntimeError("canceling statement due to statement timeout")
+        by_id = db.asset_index
+        logs = db.tables.setdefault("activity_logs", [])
+        for u in params["updates"]:
+            row = by_id.get(str(u["id"]))
+            if row is None: continue
+            row.update({"rupiah_per_kg": u["rupiah_per_kg"], "harga_tafsiran": u["harga_tafsiran"]})
+            logs.append({"asset_id": row["id"], "user_email": params.get("p_user_email"), "action": "REVALUATION",
+                         "details": f"Harga tafsiran Rp {u['old_harga_tafsiran']} -> Rp {u['harga_tafsiran']} "
+                                    f"(Rp {u['rupiah_per_kg']}/kg, {params.get('p_revaluation_id')})"})
+        return len(params["updates"])
+    return rpc_revalue_assets
+
+
+def setup(rows: int, fail_on_call: int = 0) -> StandInSupabase:
+    db = StandInSupabase()
+    db.tables["attb_assets"] = sample_assets(rows)
+    db.tables["activity_logs"] = []
+    db.asset_index = {r["id"]: r for r in db.tables["attb_assets"]}
+    db.rpcs["revalue_assets"] = make_rpc_revalue_assets(fail_on_call)
+    siprima_core.set_supabase(db)
+    return db
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--rate", type=int, default=5200)
+    args = parser.parse_args()
+
+    db = setup(args.rows)
+    _, attb = load_apps()
+    import main  # noqa: E402
+
+    body = {"rupiah_per_kg": args.rate, "rate_per_jenis": {"Kabel": args.rate + 800}, "user_email": "uji@pln.co.id"}
+
+    # Porsi waktu yang habis untuk paging di stand-in (bukan kerja backend)
+    t0 = time.perf_counter()
+    for _ in main.iter_table_pages('attb_assets', "id, konversi_kg, rupiah_per_kg, harga_tafsiran, jenis_aset, lokasi"): pass
+    paging = time.perf_counter() - t0
+
+    failures = 0
+    with TestClient(attb) as client:
+        t0 = time.perf_counter()
+        preview = client.post("/api/assets/revaluation/preview", json=body)
+        preview_s = time.perf_counter() - t0
+
+        db.reset_counters()
+        t0 = time.perf_counter()
+        applied = client.post("/api/assets/revaluation/apply", json=body)
+        apply_s = time.perf_counter() - t0
+        trips = dict(db.calls_by_table)
+
+    result = applied.json()
+    rate_of = lambda r: args.rate + 800 if r["jenis_aset"] == "Kabel" else args.rate  # noqa: E731
+    wrong = sum(1 for r in db.tables["attb_assets"] if r["harga_tafsiran"] != int(r["konversi_kg"] * rate_of(r)))
+    logged = {}
+    for log in db.tables["activity_logs"]:
+        logged[log["asset_id"]] = logged.get(log["asset_id"], 0) + 1
+    audit_ok = len(logged) == result.get("updated") and all(n == 1 for n in logged.values())
+    failures += int(preview.status_code != 200 or applied.status_code != 200 or wrong or not audit_ok)
+
+    print(f"{args.rows} aset, {result.get('updated')} berubah, {result.get('chunks')} chunk")
+    print(f"  preview                : {preview_s:7.2f} s  (paging stand-in {paging:.2f} s)")
+    print(f"  apply                  : {apply_s:7.2f} s  (paging stand-in {paging:.2f} s)")
+    print(f"  round trip apply       : {trips}")
+    print(f"  harga salah            : {wrong}")
+    print(f"  log REVALUATION        : {sum(logged.values())} ({'1 per aset' if audit_ok else 'TIDAK COCOK'})")
+
+    # Chunk ketiga gagal: dua chunk pertama sudah tersimpan dan harus dilaporkan
+    db = setup(args.rows, fail_on_call=3)
+    with TestClient(attb) as client:
+        failed = client.post("/api/assets/revaluation/apply", json=body)
+    detail = failed.json().get("detail", {})
+    partial_ok = failed.status_code == 500 and detail.get("chunks_done") == 2 \
+        and detail.get("updated") == len(db.tables["activity_logs"])
+    failures += int(not partial_ok)
+    print(f"  gagal di chunk 3       : {failed.status_code} chunks_done={detail.get('chunks_done')} "
+          f"updated={detail.get('updated')} ({'OK' if partial_ok else 'GAGAL'})")
+    sys.exit(1 if failures else 0)
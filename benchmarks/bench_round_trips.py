@@ -0,0 +1,124 @@
+"""
+Hitung round trip database per endpoint mutasi (SiJAGAD & ATTB).
+
+Setiap aksi user seharusnya cukup satu round trip ke database: update memakai
+baris hasil update (return=representation), delete + log memakai fungsi RPC,
+dan konflik edit dideteksi lewat kolom `version` tanpa select tambahan.
+Kerja di background task (log aktivitas SiJAGAD, pengosongan antrian log ATTB,
+penyimpanan generasi snapshot) berada di luar jalur request dan dilaporkan terpisah. Operasi
+Supabase Storage di jalur request tetap dihitung sebagai round trip.
+
+Fungsi RPC dari sql/*.sql ditiru di stand-in lokal. Script keluar dengan kode 1
+jika ada endpoint yang melewati anggaran round trip atau status HTTP-nya salah.
+
+Pemakaian:
+    python benchmarks/bench_round_trips.py
+"""
+import sys
+from pathlib import Path
+
+from starlette.background import BackgroundTask
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+import siprima_core  # noqa: E402
+from standin import StandInSupabase, load_apps, sample_assets, sample_letters  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+def track_background(db: StandInSupabase, counter: dict):
+    # Round trip yang terjadi di dalam background task (setelah response) dicatat terpisah
+    original = BackgroundTask.__call__
+
+    async def tracked(self):
+        before = db.calls
+        await original(self)
+        counter["calls"] += db.calls - before
+
+    BackgroundTask.__call__ = tracked
+
+
+def rpc_soft_delete_letter(db: StandInSupabase, params):
+    # Tiruan public.soft_delete_letter (SiJAGAD/Backend/sql/letters_mutations.sql)
+    for row in db.tables.get("letters", []):
+        if str(row.get("id")) != str(params["p_letter_id"]): continue
+        if params.get("p_version") is not None and row.get("version") != params["p_version"]: return []
+        row.update({"is_deleted": True, "version": row.get("version", 1) + 1})
+        db.tables.setdefault("activity_sijagad", []).append({
+            "user_email": params.get("p_user_email"), "action": "SOFT_DELETE", "target": f"Hapus: {row.get('vendor')}"})
+        return [dict(row)]
+    return []
+
+
+def rpc_delete_asset_with_logs(db: StandInSupabase, params):
+    # Tiruan public.delete_asset_with_logs (monitoring-attb/Backend/sql/asset_mutations.sql)
+    asset_id = str(params["p_asset_id"])
+    db.tables["activity_logs"] = [r for r in db.tables.get("activity_logs", []) if str(r.get("asset_id")) != asset_id]
+    deleted = [r for r in db.tables.get("attb_assets", []) if str(r.get("id")) == asset_id]
+    db.tables["attb_assets"] = [r for r in db.tables.get("attb_assets", []) if str(r.get("id")) != asset_id]
+    return [dict(r) for r in deleted]
+
+
+LETTER = {
+    "vendor": "PT Uji", "pekerjaan": "Pekerjaan Uji", "nomor_kontrak": "K-UJI",
+    "tanggal_awal_kontrak": "2025-01-01", "nominal_jaminan": 50_000_000,
+    "jenis_garansi": "Bank Garansi", "nomor_garansi": "G-UJI", "bank_penerbit": "BRI",
+    "tanggal_awal_garansi": "2025-01-01", "tanggal_akhir_garansi": "2026-01-01",
+    "status": "Aktif", "kategori": "Jaminan Pelaksanaan", "user_email": "uji@pln.co.id",
+}
+
+ASSET = {
+    "no_aset": "ATTB-UJI", "jenis_aset": "Trafo", "konversi_kg": 500, "tahun_perolehan": 2000,
+    "umur_pakai": 20, "nilai_perolehan": 100_000_000, "nilai_buku": 1_000_000,
+    "harga_tafsiran": 0, "lokasi": "GI Teling", "input_by": "uji@pln.co.id",
+}
+
+# (app, label, method, path, body, status yang diharapkan, anggaran round trip di jalur request)
+SCENARIOS = [
+    ("sijagad", "POST /letters", "post", "/letters", LETTER, 200, 1),
+    ("sijagad", "PUT /letters/{id}", "put", "/letters/1", {**LETTER, "version": 1}, 200, 1),
+    ("sijagad", "PUT /letters/{id} (versi basi)", "put", "/letters/1", {**LETTER, "version": 1}, 409, 1),
+    ("sijagad", "PUT /letters/{id} (tidak ada)", "put", "/letters/999999", LETTER, 404, 1),
+    ("sijagad", "DELETE /letters/{id}", "delete", "/letters/2?user_email=uji@pln.co.id", None, 200, 1),
+    # DB: update expired + laporan H-90 + analitik + Excel; storage: simpan generasi,
+    # 3 snapshot, list per folder + hapus snapshot lama
+    ("sijagad", "GET /api/cron-update-status", "get", "/api/cron-update-status", None, 200, 11),
+    ("attb", "POST /api/assets/input", "post", "/api/assets/input", ASSET, 201, 1),
+    ("attb", "PATCH update_status", "patch", "/api/assets/asset-1/update_status",
+     {"current_step": 2, "status_text": "AE-2", "version": 1}, 200, 1),
+    ("attb", "PATCH update_status (versi basi)", "patch", "/api/assets/asset-1/update_status",
+     {"current_step": 3, "status_text": "AE-3", "version": 1}, 409, 1),
+    ("attb", "PATCH update_details", "patch", "/api/assets/asset-2/update_details",
+     {"keterangan": "Dicek", "version": 1}, 200, 1),
+    ("attb", "DELETE /api/assets/{id}", "delete", "/api/assets/asset-3", None, 200, 1),
+    ("attb", "DELETE /api/assets/{id} (tidak ada)", "delete", "/api/assets/asset-x", None, 404, 1),
+]
+
+
+if __name__ == "__main__":
+    db = StandInSupabase()
+    db.tables["letters"] = sample_letters(200)
+    db.tables["attb_assets"] = sample_assets(200)
+    db.tables["activity_logs"] = [{"asset_id": "asset-3", "action": "CREATE"}]
+    db.rpcs["soft_delete_letter"] = rpc_soft_delete_letter
+    db.rpcs["delete_asset_with_logs"] = rpc_delete_asset_with_logs
+    siprima_core.set_supabase(db)
+    sijagad, attb = load_apps()
+
+    background = {"calls": 0}
+    track_background(db, background)
+    failures = 0
+    clients = {"sijagad": TestClient(sijagad), "attb": TestClient(attb)}
+    print(f"{'endpoint':36s} {'status':>6s} {'request':>8s} {'background':>10s}  tabel")
+    for app_name, label, method, path, body, expected, budget in SCENARIOS:
+        db.reset_counters()
+        background["calls"] = 0
+        kwargs = {"json": body} if body is not None else {}
+        r = getattr(clients[app_name], method)(path, **kwargs)
+        after_request = background["calls"]
+        by_table = dict(db.calls_by_table)
+        request_trips = db.calls - after_request
+        ok = r.status_code == expected and request_trips <= budget
+        failures += int(not ok)
+        print(f"{label:36s} {r.status_code:6d} {request_trips:8d} {after_request:10d}  {by_table}{'' if ok else '  <-- GAGAL'}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,334 @@
+"""
+Load test kedua backend dengan campuran trafik yang realistis.
+
+App SiJAGAD dan ATTB dijalankan sebagai server uvicorn sungguhan (1 worker
+masing-masing) di atas stand-in database lokal dengan latency buatan, plus
+stand-in API Telegram. Sejumlah user virtual menjalankan skenario selama
+--duration detik:
+
+  morning_dashboard   : buka dashboard pagi (analitik, daftar surat, exposure,
+                        statistik & daftar aset, log terbaru)
+  bulk_import         : input aset & surat baru berturut-turut + bulk update tahap
+  telegram_burst      : ledakan perintah /info (dan /vendor, /kategori) ke
+                        webhook, termasuk retry update_id yang sama dari Telegram
+  export_with_writes  : export Excel/CSV berjalan bersamaan dengan edit data
+
+Per skenario dilaporkan throughput, latency p50/p95/p99/maks dan error rate.
+Hasil bisa disimpan sebagai baseline lalu dibandingkan pada run berikutnya;
+script keluar dengan kode 1 jika ada regresi di atas --tolerance.
+
+Pemakaian:
+    python benchmarks/loadtest.py --users 20 --duration 15 --save-baseline
+    python benchmarks/loadtest.py --users 20 --duration 15          # bandingkan dengan baseline
+    python benchmarks/loadtest.py --scenario telegram_burst --users 50
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "loadtest_baseline.json"
+
+# (app, method, path, body, label)
+Step = Tuple[str, str, str, Optional[Dict[str, Any]], str]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class TelegramStandIn:
+    """Server lokal pengganti api.telegram.org; hanya mencatat pesan yang dikirim."""
+
+    def __init__(self):
+        self.messages = 0
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with stand_in._lock: stand_in.messages += 1
+                body = b'{"ok":true,"result":{}}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", free_port()), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def serve(app) -> str:
+    import uvicorn
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started: time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+# --- SKENARIO ---
+# Setiap skenario: fungsi (user, iterasi, rng) -> Step. Counter global menjaga data unik antar user.
+_seq = itertools.count(1)
+
+
+def morning_dashboard(user: int, i: int, rng: random.Random) -> Step:
+    steps: List[Step] = [
+        ("sijagad", "GET", "/api/analytics", None, "sijagad /api/analytics"),
+        ("sijagad", "GET", "/letters/active", None, "sijagad /letters/active"),
+        ("sijagad", "GET", "/api/analytics/exposure?bucket=month&horizon=12", None, "sijagad /api/analytics/exposure"),
+        ("attb", "GET", "/api/dashboard/stats", None, "attb /api/dashboard/stats"),
+        ("attb", "GET", "/api/assets/list", None, "attb /api/assets/list"),
+        ("attb", "POST", "/api/assets/logs/batch",
+         {"asset_ids": [f"asset-{rng.randint(1, 500)}" for _ in range(20)], "limit_per_asset": 3}, "attb /api/assets/logs/batch"),
+    ]
+    return steps[(user + i) % len(steps)]
+
+
+def bulk_import(user: int, i: int, rng: random.Random) -> Step:
+    n = next(_seq)
+    if i % 3 == 0:
+        return ("attb", "POST", "/api/assets/input", {
+            "no_aset": f"LT-{n:07d}", "jenis_aset": "Trafo", "konversi_kg": 100 + n % 400, "tahun_perolehan": 2000,
+            "umur_pakai": 20, "nilai_perolehan": 100_000_000, "nilai_buku": 1_000_000, "harga_tafsiran": 0,
+            "lokasi": "GI Teling", "input_by": f"user{user}@pln.co.id"}, "attb POST /api/assets/input")
+    if i % 3 == 1:
+        return ("sijagad", "POST", "/letters", {
+            "vendor": f"PT Import {n}", "pekerjaan": "Pekerjaan Import", "nomor_kontrak": f"LT-K-{n:07d}",
+            "tanggal_awal_kontrak": "2025-01-01", "nominal_jaminan": 10_000_000 + n, "jenis_garansi": "Bank Garansi",
+            "nomor_garansi": f"LT-G-{n:07d}", "bank_penerbit": "BRI", "tanggal_awal_garansi": "2025-01-01",
+            "tanggal_akhir_garansi": "2027-01-01", "status": "Aktif", "kategori": "Jaminan Pelaksanaan",
+            "user_email": f"user{user}@pln.co.id"}, "sijagad POST /letters")
+    target = rng.randint(2, 6)
+    return ("attb", "PATCH", "/api/assets/bulk_update_status", {
+        "asset_ids": [f"asset-{rng.randint(1, 2000)}" for _ in range(25)], "current_step": target,
+        "status_text": f"Tahap {target}", "user_email": f"user{user}@pln.co.id"}, "attb PATCH bulk_update_status")
+
+
+_recent_updates: List[int] = []
+
+
+def telegram_burst(user: int, i: int, rng: random.Random) -> Step:
+    if i % 10 == 9 and _recent_updates:
+        # Telegram mengirim ulang update yang sama jika webhook dianggap lambat
+        update_id = rng.choice(_recent_updates[-50:])
+        label = "sijagad webhook (retry)"
+    else:
+        update_id = 10_000_000 + next(_seq)
+        _recent_updates.append(update_id)
+        label = "sijagad webhook"
+    text = rng.choice(["/info", "/info", "/info", "/vendor Vendor 1", "/kategori"])
+    return ("sijagad", "POST", "/telegram-webhook", {
+        "update_id": update_id,
+        "message": {"text": text, "chat": {"id": 5000 + user}, "from": {"first_name": f"User{user}"}}}, label)
+
+
+def export_with_writes(user: int, i: int, rng: random.Random) -> Step:
+    if user % 4 == 0:
+        if i % 2 == 0: return ("sijagad", "GET", "/export/excel?fresh=true", None, "sijagad /export/excel")
+        return ("attb", "GET", "/api/assets/export?format=csv", None, "attb /api/assets/export csv")
+    if i % 2 == 0:
+        letter_id = rng.randint(1, 500)
+        return ("sijagad", "PUT", f"/letters/{letter_id}", {
+            "vendor": f"PT Vendor {letter_id % 40}", "pekerjaan": f"Pekerjaan {letter_id}", "nomor_kontrak": f"K-{letter_id:05d}",
+            "tanggal_awal_kontrak": "2025-01-01", "nominal_jaminan": 25_000_000 + i, "jenis_garansi": "Bank Garansi",
+            "nomor_garansi": f"G-{letter_id:05d}", "bank_penerbit": "BNI", "tanggal_awal_garansi": "2025-01-01",
+            "tanggal_akhir_garansi": "2027-06-30", "status": "Aktif", "kategori": "Jaminan Pelaksanaan",
+            "user_email": f"user{user}@pln.co.id"}, "sijagad PUT /letters/{id}")
+    return ("attb", "PATCH", f"/api/assets/asset-{rng.randint(1, 2000)}/update_details",
+            {"keterangan": f"Dicek user {user} #{i}", "user_email": f"user{user}@pln.co.id"}, "attb PATCH update_details")
+
+
+SCENARIOS: Dict[str, Callable[[int, int, random.Random], Step]] = {
+    "morning_dashboard": morning_dashboard,
+    "bulk_import": bulk_import,
+    "telegram_burst": telegram_burst,
+    "export_with_writes": export_with_writes,
+}
+
+
+# --- PENGUKURAN ---
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values: return 0.0
+    return sorted_values[max(0, math.ceil(p * len(sorted_values)) - 1)]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "error_rate": round(errors / len(values), 4) if values else 0.0,
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 0.50), 1),
+        "p95_ms": round(percentile(values, 0.95), 1),
+        "p99_ms": round(percentile(values, 0.99), 1),
+        "max_ms": round(values[-1], 1) if values else 0.0,
+    }
+
+
+def run_scenario(name: str, bases: Dict[str, str], users: int, duration: float, seed: int) -> Dict[str, Any]:
+    import httpx
+    step_fn = SCENARIOS[name]
+    lock = threading.Lock()
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    stop_at = time.perf_counter() + duration
+
+    def user_loop(user: int):
+        rng = random.Random(seed * 1000 + user)
+        clients = {app: httpx.Client(base_url=url, timeout=60) for app, url in bases.items()}
+        try:
+            for i in itertools.count():
+                if time.perf_counter() >= stop_at: break
+                app, method, path, body, label = step_fn(user, i, rng)
+                t0 = time.perf_counter()
+                try:
+                    r = clients[app].request(method, path, json=body)
+                    failed = r.status_code >= 400
+                except Exception:
+                    failed = True
+                ms = (time.perf_counter() - t0) * 1000
+                with lock:
+                    latencies.setdefault(label, []).append(ms)
+                    errors[label] = errors.get(label, 0) + int(failed)
+        finally:
+            for c in clients.values(): c.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user_loop, range(users)))
+    elapsed = time.perf_counter() - started
+
+    all_latencies = [ms for values in latencies.values() for ms in values]
+    result = summarize(all_latencies, sum(errors.values()), elapsed)
+    result["endpoints"] = {label: summarize(values, errors.get(label, 0), elapsed) for label, values in sorted(latencies.items())}
+    return result
+
+
+# --- BASELINE ---
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, out=sys.stdout) -> List[str]:
+    regressions = []
+    print(f"\nDibandingkan dengan baseline ({baseline['meta'].get('saved_at', '?')}, toleransi {tolerance:.0%}):", file=out)
+    print(f"{'skenario':20s} {'rps':>16s} {'p95 ms':>18s} {'error rate':>18s}", file=out)
+    for name, cur in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            print(f"{name:20s} (tidak ada di baseline)", file=out)
+            continue
+        d_rps = (cur["throughput_rps"] - base["throughput_rps"]) / base["throughput_rps"] if base["throughput_rps"] else 0.0
+        d_p95 = (cur["p95_ms"] - base["p95_ms"]) / base["p95_ms"] if base["p95_ms"] else 0.0
+        flags = []
+        if d_rps < -tolerance: flags.append("throughput turun")
+        if d_p95 > tolerance: flags.append("p95 naik")
+        if cur["error_rate"] > base["error_rate"] + 0.01: flags.append("error naik")
+        if flags: regressions.append(f"{name}: {', '.join(flags)}")
+        print(f"{name:20s} {cur['throughput_rps']:7.1f} ({d_rps:+6.1%}) {cur['p95_ms']:8.1f} ({d_p95:+6.1%}) "
+              f"{cur['error_rate']:8.2%} (vs {base['error_rate']:.2%}){'  <-- ' + ', '.join(flags) if flags else ''}", file=out)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS), help="Default: semua skenario")
+    parser.add_argument("--users", type=int, default=20, help="User virtual bersamaan per skenario")
+    parser.add_argument("--duration", type=float, default=15, help="Durasi per skenario (detik)")
+    parser.add_argument("--db-latency", type=float, default=15, help="Latency query stand-in (ms)")
+    parser.add_argument("--write-latency", type=float, default=25, help="Latency tulis stand-in (ms)")
+    parser.add_argument("--letters", type=int, default=2000)
+    parser.add_argument("--assets", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Simpan hasil run ini sebagai baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Batas regresi relatif (0.2 = 20%%)")
+    parser.add_argument("--json", type=Path, help="Tulis hasil lengkap ke file JSON")
+    parser.add_argument("--verbose", action="store_true", help="Tampilkan log print dari kedua app")
+    args = parser.parse_args()
+
+    # Log print per request dari app ditahan agar laporan tetap terbaca
+    report = sys.stdout
+    if not args.verbose: sys.stdout = open(os.devnull, "w")
+
+    # Konfigurasi harus terpasang sebelum app di-import
+    telegram = TelegramStandIn()
+    os.environ.update({
+        "TELEGRAM_BOT_TOKEN": "loadtest", "TELEGRAM_CHAT_ID": "-1000", "TELEGRAM_API_BASE": telegram.url,
+        "SIPRIMA_SNAPSHOT_DIR": tempfile.mkdtemp(prefix="siprima_loadtest_snap_"),
+        "SIPRIMA_CACHE_DIR": tempfile.mkdtemp(prefix="siprima_loadtest_cache_"),
+    })
+
+    import siprima_core  # noqa: E402
+    from standin import StandInSupabase, load_apps, sample_assets, sample_letters  # noqa: E402
+
+    db = StandInSupabase(latency=args.db_latency / 1000, write_latency=args.write_latency / 1000)
+    db.tables["letters"] = sample_letters(args.letters)
+    db.tables["attb_assets"] = sample_assets(args.assets)
+    db.tables["activity_logs"] = [{"id": i + 1, "asset_id": f"asset-{i % 500 + 1}", "user_email": "seed@pln.co.id",
+                                   "action": "CREATE", "details": "seed", "created_at": f"2025-01-01T00:00:{i % 60:02d}"}
+                                  for i in range(5000)]
+    siprima_core.set_supabase(db)
+    sijagad, attb = load_apps()
+    bases = {"sijagad": serve(sijagad), "attb": serve(attb)}
+
+    import httpx  # noqa: E402
+    # Seperti pagi hari: cron malam sudah menyiapkan snapshot laporan
+    httpx.get(bases["sijagad"] + "/api/cron-update-status", timeout=120).raise_for_status()
+
+    names = args.scenario or list(SCENARIOS)
+    results: Dict[str, Any] = {
+        "meta": {
+            "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"), "users": args.users, "duration": args.duration,
+            "db_latency_ms": args.db_latency, "write_latency_ms": args.write_latency,
+            "letters": args.letters, "assets": args.assets, "python": sys.version.split()[0],
+        },
+        "scenarios": {},
+    }
+    print(f"{args.users} user virtual, {args.duration:.0f} s per skenario, latency DB {args.db_latency:.0f}/{args.write_latency:.0f} ms", file=report)
+    print(f"{'skenario':20s} {'request':>8s} {'rps':>7s} {'p50':>7s} {'p95':>7s} {'p99':>7s} {'maks':>8s} {'error':>7s}", file=report)
+    for name in names:
+        telegram_before = telegram.messages
+        r = run_scenario(name, bases, args.users, args.duration, args.seed)
+        if name == "telegram_burst": r["telegram_messages_sent"] = telegram.messages - telegram_before
+        results["scenarios"][name] = r
+        print(f"{name:20s} {r['requests']:8d} {r['throughput_rps']:7.1f} {r['p50_ms']:7.1f} {r['p95_ms']:7.1f} "
+              f"{r['p99_ms']:7.1f} {r['max_ms']:8.1f} {r['error_rate']:7.2%}", file=report)
+        for label, e in r["endpoints"].items():
+            print(f"  {label:34s} {e['requests']:6d} req  p95 {e['p95_ms']:8.1f} ms  error {e['error_rate']:.2%}", file=report)
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+    exit_code = 0
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2))
+        print(f"\nBaseline disimpan ke {args.baseline}", file=report)
+    elif args.baseline.exists():
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance, report)
+        if regressions:
+            print("\nREGRESI: " + "; ".join(regressions), file=report)
+            exit_code = 1
+    else:
+        print(f"\nBelum ada baseline di {args.baseline} (jalankan dengan --save-baseline)", file=report)
+    os._exit(exit_code)
@@ -0,0 +1,305 @@
+"""
+Stand-in lokal untuk Supabase, dipakai benchmark & load test.
+
+Meniru subset query builder supabase-py yang dipakai kedua backend
+(select/insert/update/delete/upsert, filter eq/neq/in_/gte/lte/lt/gt/or_,
+order/limit/range/single, rpc) di atas tabel in-memory, plus bucket storage
+(upload/download/list/remove) untuk snapshot & arsip log. Setiap `execute()` atau operasi
+storage dihitung sebagai satu round trip dan bisa diberi latency buatan.
+"""
+import itertools
+import sys
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+class StandInResponse:
+    def __init__(self, data: Any, count: Any = None):
+        self.data = data
+        self.count = count
+
+
+def _parse_or(expr: str) -> Callable[[Dict[str, Any]], bool]:
+    # Format PostgREST sederhana: "kolom.eq.nilai,kolom.eq.nilai"
+    parts = []
+    for cond in expr.split(","):
+        column, op, value = cond.split(".", 2)
+        parts.append((column, op, value))
+
+    def match(row):
+        for column, op, value in parts:
+            if op == "eq" and str(row.get(column)) == value: return True
+            if op == "neq" and str(row.get(column)) != value: return True
+        return False
+    return match
+
+
+def _native(a: Any, b: Any):
+    return (a, b) if type(a) is type(b) else (str(a), str(b))
+
+
+class StandInQuery:
+    def __init__(self, db: "StandInSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.payload: Any = None
+        self.filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self._order: List[tuple] = []
+        self._limit = None
+        self._range = None
+        self._single = False
+        self._on_conflict = None
+        self._ignore_duplicates = False
+
+    def select(self, *args, **kwargs): self.op = "select"; return self
+    def insert(self, payload, **kwargs): self.op = "insert"; self.payload = payload; return self
+    def update(self, payload, **kwargs): self.op = "update"; self.payload = payload; return self
+    def delete(self, **kwargs): self.op = "delete"; return self
+
+    def upsert(self, payload, on_conflict: str = "id", ignore_duplicates: bool = False, **kwargs):
+        self.op = "upsert"; self.payload = payload; self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates; return self
+
+    def _cmp(self, column, fn):
+        self.filters.append(lambda r: r.get(column) is not None and fn(r.get(column)))
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: str(r.get(column)) == str(value)); return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda r: str(r.get(column)) != str(value)); return self
+
+    def in_(self, column, values):
+        allowed = {str(v) for v in values}
+        self.filters.append(lambda r: str(r.get(column)) in allowed); return self
+
+    def is_(self, column, value):
+        target = None if value in (None, "null") else value
+        self.filters.append(lambda r: r.get(column) is target); return self
+
+    # Nilai bertipe sama dibandingkan apa adanya (konsisten dengan order()), selain itu sebagai teks
+    def gte(self, column, value): return self._cmp(column, lambda v: _native(v, value)[0] >= _native(v, value)[1])
+    def lte(self, column, value): return self._cmp(column, lambda v: _native(v, value)[0] <= _native(v, value)[1])
+    def gt(self, column, value): return self._cmp(column, lambda v: _native(v, value)[0] > _native(v, value)[1])
+    def lt(self, column, value): return self._cmp(column, lambda v: _native(v, value)[0] < _native(v, value)[1])
+
+    def or_(self, expr): self.filters.append(_parse_or(expr)); return self
+    def order(self, column, desc=False): self._order.append((column, desc)); return self
+    def limit(self, n): self._limit = n; return self
+    def range(self, start, end): self._range = (start, end); return self
+    def single(self): self._single = True; return self
+
+    def _matching(self, rows):
+        return [r for r in rows if all(f(r) for f in self.filters)]
+
+    def execute(self):
+        self.db._round_trip(self.table, self.op)
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.op in ("insert", "upsert"):
+                payload = self.payload if isinstance(self.payload, list) else [self.payload]
+                out = []
+                for item in payload:
+                    item = dict(item)
+                    existing = None
+                    if self.op == "upsert":
+                        keys = [k.strip() for k in (self._on_conflict or "id").split(",")]
+                        existing = next((r for r in rows if all(str(r.get(k)) == str(item.get(k)) for k in keys)), None)
+                    if existing is not None:
+                        if self._ignore_duplicates: continue
+                        existing.update(item); out.append(dict(existing))
+                    else:
+                        # Ikuti tipe kolom id tabel (attb_assets: uuid/text, lainnya: serial)
+                        text_ids = bool(rows) and isinstance(rows[0].get("id"), str)
+                        item.setdefault("id", str(uuid.uuid4()) if text_ids else next(self.db.ids))
+                        rows.append(item); out.append(dict(item))
+                return StandInResponse(out)
+            matched = self._matching(rows)
+            if self.op == "update":
+                for r in matched: r.update(self.payload)
+                return StandInResponse([dict(r) for r in matched])
+            if self.op == "delete":
+                ids = {id(r) for r in matched}
+                self.db.tables[self.table] = [r for r in rows if id(r) not in ids]
+                return StandInResponse([dict(r) for r in matched])
+            for column, desc in reversed(self._order):
+                matched = sorted(matched, key=lambda r: (r.get(column) is None, "" if r.get(column) is None else r.get(column)), reverse=desc)
+            if self._range: matched = matched[self._range[0]:self._range[1] + 1]
+            if self._limit is not None: matched = matched[:self._limit]
+            data = [dict(r) for r in matched]
+        if self._single:
+            if len(data) != 1: raise RuntimeError("JSON object requested, multiple (or no) rows returned")
+            return StandInResponse(data[0])
+        return StandInResponse(data, len(data))
+
+
+class StandInRpc:
+    def __init__(self, db: "StandInSupabase", fn: str, params: Dict[str, Any]):
+        self.db, self.fn, self.params = db, fn, params
+
+    def execute(self):
+        self.db._round_trip(f"rpc:{self.fn}", "rpc")
+        handler = self.db.rpcs.get(self.fn)
+        if handler is None: raise RuntimeError(f"Could not find the function public.{self.fn}")
+        with self.db.lock:
+            return StandInResponse(handler(self.db, self.params))
+
+
+class StandInBucket:
+    def __init__(self, db: "StandInSupabase", name: str):
+        self.db, self.name = db, name
+
+    def upload(self, path: str, file: bytes, file_options: Any = None):
+        self.db._round_trip(f"storage:{self.name}", "upload")
+        with self.db.lock: self.db.objects[(self.name, path)] = bytes(file)
+        return {"Key": f"{self.name}/{path}"}
+
+    def download(self, path: str) -> bytes:
+        self.db._round_trip(f"storage:{self.name}", "select")
+        with self.db.lock:
+            if (self.name, path) not in self.db.objects: raise RuntimeError(f"Object not found: {path}")
+            return self.db.objects[(self.name, path)]
+
+    def list(self, path: str = "", options: Any = None) -> List[Dict[str, Any]]:
+        # Satu level folder seperti Storage API: folder dikembalikan dengan id None
+        self.db._round_trip(f"storage:{self.name}", "select")
+        options = options or {}
+        prefix = f"{path.strip('/')}/" if path.strip("/") else ""
+        entries: Dict[str, Any] = {}
+        with self.db.lock:
+            for bucket, key in self.db.objects:
+                if bucket != self.name or not key.startswith(prefix): continue
+                head, sep, _ = key[len(prefix):].partition("/")
+                entries.setdefault(head, None if sep else key)
+        items = [{"name": n, "id": key} for n, key in sorted(entries.items())]
+        offset = int(options.get("offset", 0))
+        return items[offset:offset + int(options.get("limit", 100))]
+
+    def remove(self, paths: List[str]):
+        self.db._round_trip(f"storage:{self.name}", "delete")
+        with self.db.lock:
+            for path in paths: self.db.objects.pop((self.name, path), None)
+        return []
+
+
+class StandInStorage:
+    def __init__(self, db: "StandInSupabase"):
+        self.db = db
+
+    def from_(self, bucket: str) -> StandInBucket:
+        return StandInBucket(self.db, bucket)
+
+
+class StandInSupabase:
+    def __init__(self, latency: float = 0.0, write_latency: float = 0.0):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.rpcs: Dict[str, Callable[["StandInSupabase", Dict[str, Any]], Any]] = {}
+        self.objects: Dict[tuple, bytes] = {}
+        self.storage = StandInStorage(self)
+        self.ids = itertools.count(1)
+        self.latency = latency
+        self.write_latency = write_latency
+        self.lock = threading.RLock()
+        self.calls = 0
+        self.select_calls = 0
+        self.calls_by_table: Dict[str, int] = {}
+
+    def _round_trip(self, table: str, op: str):
+        with self.lock:
+            self.calls += 1
+            if op == "select": self.select_calls += 1
+            self.calls_by_table[table] = self.calls_by_table.get(table, 0) + 1
+        delay = self.latency if op == "select" else (self.write_latency or self.latency)
+        if delay: time.sleep(delay)
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls = 0
+            self.select_calls = 0
+            self.calls_by_table = {}
+
+    def table(self, name: str) -> StandInQuery:
+        return StandInQuery(self, name)
+
+    def rpc(self, fn: str, params: Any = None) -> StandInRpc:
+        return StandInRpc(self, fn, params or {})
+
+
+def sample_letters(n: int) -> List[Dict[str, Any]]:
+    today = date.today()
+    vendors = [f"PT Vendor {i}" for i in range(40)]
+    banks = ["BRI", "BNI", "Mandiri", "BSG", "BCA"]
+    jenis = ["Bank Garansi", "Surety Bond", "Asuransi"]
+    rows = []
+    for i in range(n):
+        end = today + timedelta(days=(i * 7) % 720 - 180)
+        rows.append({
+            "id": i + 1,
+            "vendor": vendors[i % len(vendors)],
+            "pekerjaan": f"Pekerjaan {i}",
+            "nomor_kontrak": f"K-{i:05d}",
+            "tanggal_awal_kontrak": str(end - timedelta(days=400)),
+            "nominal_jaminan": 10_000_000 + (i * 7919) % 500_000_000,
+            "jenis_garansi": jenis[i % len(jenis)],
+            "nomor_garansi": f"G-{i:05d}",
+            "bank_penerbit": banks[i % len(banks)],
+            "tanggal_awal_garansi": str(end - timedelta(days=365)),
+            "tanggal_akhir_garansi": str(end),
+            "status": "Expired" if end < today else "Aktif",
+            "kategori": "Jaminan Pelaksanaan" if i % 2 else "Jaminan Pemeliharaan",
+            "lokasi": "Arsip",
+            "file_url": None,
+            "is_deleted": False,
+            "version": 1,
+            "created_at": f"2025-01-01T00:00:{i % 60:02d}",
+        })
+    return rows
+
+
+def sample_assets(n: int) -> List[Dict[str, Any]]:
+    jenis = ["Trafo", "Kabel", "Tower", "PMT"]
+    lokasi = ["GI Teling", "GI Ranomut", "GI Lopana"]
+    rows = []
+    for i in range(n):
+        kg = 100.0 + i % 400
+        rows.append({
+            "id": f"asset-{i + 1}",
+            "no_aset": f"ATTB-{i:06d}",
+            "jenis_aset": jenis[i % len(jenis)],
+            "merk_type": "Unindo",
+            "spesifikasi": "150 kV",
+            "jumlah": 1,
+            "satuan": "Unit",
+            "konversi_kg": kg,
+            "tahun_perolehan": 1990 + i % 30,
+            "umur_pakai": 20,
+            "nilai_perolehan": 150_000_000,
+            "nilai_buku": 1_000_000,
+            "rupiah_per_kg": 4300,
+            "harga_tafsiran": int(kg * 4300),
+            "lokasi": lokasi[i % len(lokasi)],
+            "keterangan": None,
+            "foto_url": None,
+            "status": "Draft",
+            "current_step": 1 + i % 6,
+            "version": 1,
+            "created_at": f"2025-01-01T00:{i % 60:02d}:00",
+        })
+    return rows
+
+
+def load_apps():
+    """Import app FastAPI SiJAGAD (api/index.py) dan ATTB (main.py)."""
+    for path in (ROOT, ROOT / "SiJAGAD" / "Backend" / "api", ROOT / "monitoring-attb" / "Backend"):
+        if str(path) not in sys.path: sys.path.insert(0, str(path))
+    import index  # noqa: E402
+    import main  # noqa: E402
+    return index.app, main.app
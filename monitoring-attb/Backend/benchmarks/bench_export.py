@@ -0,0 +1,95 @@
+"""
+Benchmark throughput export register ATTB (xlsx / csv / parquet).
+
+Data aset dibuat sintetis per halaman (seperti hasil iter_table_pages),
+jadi tidak butuh koneksi Supabase. Yang diukur: baris/detik dan puncak
+alokasi memori Python (tracemalloc) per format, diukur pada dua ukuran
+data untuk memastikan memori tidak tumbuh mengikuti jumlah baris.
+
+Pemakaian:
+    python benchmarks/bench_export.py --rows 100000 --page-size 1000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parents[1]
+ROOT = BACKEND.parents[1]
+sys.path[:0] = [str(ROOT), str(BACKEND)]
+import main  # noqa: E402
+
+
+def synthetic_pages(total: int, page_size: int):
+    for start in range(0, total, page_size):
+        yield [{
+            "id": str(i),
+            "no_aset": f"ATTB-{i:07d}",
+            "jenis_aset": ["Trafo", "Kabel", "Tower", "PMT"][i % 4],
+            "merk_type": "Unindo",
+            "spesifikasi": "[KODE: TR-01] 60 MVA" if i % 5 == 0 else "150 kV",
+            "jumlah": 1 + i % 3,
+            "satuan": "Unit",
+            "konversi_kg": 125.5 + i % 100,
+            "tahun_perolehan": 1990 + i % 30,
+            "umur_pakai": 20,
+            "nilai_perolehan": 150_000_000 + i,
+            "nilai_buku": 1_000_000 + i,
+            "rupiah_per_kg": 4300,
+            "harga_tafsiran": int((125.5 + i % 100) * 4300),
+            "lokasi": ["GI Teling", "GI Ranomut", "GI Lopana"][i % 3],
+            "keterangan": None,
+            "foto_url": None,
+            "status": "Draft",
+            "current_step": 1 + i % 6,
+            "created_at": "2026-01-01T00:00:00",
+        } for i in range(start, min(start + page_size, total))]
+
+
+def export_once(fmt: str, rows: int, page_size: int, path: str):
+    pages = synthetic_pages(rows, page_size)
+    if fmt == "xlsx":
+        main.write_assets_xlsx(pages, path)
+    elif fmt == "parquet":
+        main.write_assets_parquet(pages, path)
+    else:
+        with open(path, "wb") as f:
+            for chunk in main.iter_assets_csv(pages): f.write(chunk)
+
+
+def run(fmt: str, rows: int, page_size: int, memory_rows: int):
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        # Pass 1: throughput (tanpa tracemalloc, karena tracemalloc memperlambat berkali lipat)
+        t0 = time.perf_counter()
+        export_once(fmt, rows, page_size, path)
+        elapsed = time.perf_counter() - t0
+        size = os.path.getsize(path)
+        # Pass 2: puncak memori, untuk dua ukuran data -> harus hampir sama (konstan)
+        peaks = []
+        for n in (memory_rows, memory_rows * 4):
+            tracemalloc.start()
+            export_once(fmt, n, page_size, path)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    finally:
+        os.remove(path)
+    print(f"{fmt:8s} {rows:>9,d} baris  {elapsed:7.2f} s  {rows / elapsed:>10,.0f} baris/s  "
+          f"file {size / 1e6:6.1f} MB  peak {peaks[0] / 1e6:5.1f} MB @ {memory_rows:,d} / "
+          f"{peaks[1] / 1e6:5.1f} MB @ {memory_rows * 4:,d}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--page-size", type=int, default=main.FETCH_PAGE_SIZE)
+    parser.add_argument("--memory-rows", type=int, default=5_000)
+    parser.add_argument("--formats", default="csv,xlsx,parquet")
+    args = parser.parse_args()
+    for fmt in args.formats.split(","):
+        try: run(fmt.strip(), args.rows, args.page_size, args.memory_rows)
+        except ImportError as e: print(f"{fmt:8s} dilewati ({e})")
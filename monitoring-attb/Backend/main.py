@@ -1,35 +1,33 @@
 import os
-from typing import Optional, List, Dict, Any, Union
+import json
+import time
+import hashlib
+import queue
+import atexit
+import threading
+import tempfile
+from copy import copy
+from typing import Optional, List, Dict, Any, Tuple
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from fastapi import FastAPI, HTTPException, status
+import numpy as np
+from fastapi import BackgroundTasks, FastAPI, Header, HTTPException, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from supabase import create_client, Client
-from dotenv import load_dotenv
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, PositiveInt
 
 # --- 1. SETUP ENVIRONMENT & KONEKSI ---
-env_path = Path(__file__).resolve().parent.parent / '.env'
-load_dotenv(dotenv_path=env_path)
+# Client Supabase dibuat lazy & dipakai bersama lewat siprima_core (pool HTTP/2, timeout, retry)
+from siprima_core import ArchiveUnavailable, DatabaseUnavailable, compact_logs, cron_authorized, daily_counts, get_supabase, is_missing_function, load_env, parse_day, probe, query_logs, read_coalesced, read_with_fallback, use_credentials
 
-if not os.environ.get("NEXT_PUBLIC_SUPABASE_URL"):
-    load_dotenv()
+load_env(Path(__file__).resolve().parent.parent / '.env')
+use_credentials("NEXT_PUBLIC_SUPABASE_URL", "NEXT_PUBLIC_SUPABASE_ANON_KEY")
 
-url: str = os.environ.get("NEXT_PUBLIC_SUPABASE_URL") or ""
-key: str = os.environ.get("NEXT_PUBLIC_SUPABASE_ANON_KEY") or ""
-
-supabase: Union[Client, None] = None
-
-if not url or not key:
-    print(f"❌ ERROR: Credential Supabase tidak ditemukan. Cek file .env Anda.")
-else:
-    try:
-        supabase = create_client(url, key)
-        print("✅ Koneksi Supabase Berhasil")
-    except Exception as e:
-        print(f"⚠️ Warning: Gagal koneksi ke Supabase: {e}")
-        supabase = None
+def require_supabase():
+    supabase = get_supabase()
+    if supabase is None: raise DatabaseUnavailable("Database Offline")
+    return supabase
 
 # --- 2. SETUP FASTAPI ---
 app = FastAPI(title="API Monitoring ATTB PLN", version="2.0.5")
@@ -41,6 +39,12 @@ origins = [
     "*"
 ]
 
+@app.exception_handler(DatabaseUnavailable)
+def database_unavailable_handler(request: Request, exc: DatabaseUnavailable):
+    # Supabase tidak bisa diakses dan belum ada snapshot cache untuk endpoint ini
+    print(f"❌ Database Unavailable: {exc}")
+    return JSONResponse(status_code=503, content={"detail": "Database Offline"})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -85,6 +89,7 @@ class AssetStatusUpdate(BaseModel):
     current_step: int
     status_text: str
     user_email: Optional[str] = "Admin"
+    version: Optional[int] = None # Versi baris saat data dibuka (optimistic concurrency)
 
 class AssetDetailUpdate(BaseModel):
     jenis_aset: Optional[str] = None
@@ -96,22 +101,131 @@ class AssetDetailUpdate(BaseModel):
     satuan: Optional[str] = None
     nilai_buku: Optional[float] = None # Update boleh float nanti dicasting manual
     user_email: Optional[str] = "Admin"
-
-# --- HELPER LOG ---
-def create_log(asset_id: str, user_email: str, action: str, details: str):
-    if supabase is None: return
+    version: Optional[int] = None
+
+# --- HELPER LOG (ANTRIAN + BACKGROUND TASK) ---
+# Log aktivitas tidak ditulis langsung di dalam request. Entri dimasukkan ke
+# antrian, lalu background task response (masih di dalam invocation yang sama,
+# karena instance Vercel dibekukan setelah invocation selesai) mengosongkannya ke
+# 'activity_logs' dengan insert multi-baris. Entri dari request yang bersamaan
+# ikut satu batch. Request mutasi cukup satu kali round trip ke database.
+LOG_QUEUE_MAXSIZE = int(os.environ.get("ATTB_LOG_QUEUE_MAXSIZE") or 1000)
+LOG_BATCH_SIZE = int(os.environ.get("ATTB_LOG_BATCH_SIZE") or 50)
+LOG_RETRY_BACKOFF = float(os.environ.get("ATTB_LOG_RETRY_BACKOFF") or 0.2)
+
+class AuditLogQueue:
+    def __init__(self, maxsize: int, batch_size: int, retry_backoff: float = LOG_RETRY_BACKOFF):
+        # Item antrian: (jumlah percobaan gagal sebelumnya, entri)
+        self.queue: "queue.Queue[Tuple[int, Dict[str, Any]]]" = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.retry_backoff = retry_backoff
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.requeued = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def put(self, entry: Dict[str, Any]) -> bool:
+        # Backpressure: jika antrian penuh, entri dibuang (bukan memblok request)
+        try:
+            self.queue.put_nowait((0, entry))
+        except queue.Full:
+            with self._lock: self.dropped += 1
+            print(f"⚠️ Log Queue penuh, entri dibuang: {entry.get('action')}")
+            return False
+        with self._lock: self.enqueued += 1
+        return True
+
+    def _drain(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        while len(batch) < limit:
+            try: batch.append(self.queue.get_nowait())
+            except queue.Empty: break
+        return batch
+
+    def _requeue(self, batch: List[Tuple[int, Dict[str, Any]]]) -> int:
+        # Entri yang baru gagal sekali dimasukkan lagi ke antrian (tetap dalam batas maxsize)
+        requeued = 0
+        for attempts, entry in batch:
+            if attempts >= 1: continue
+            try:
+                self.queue.put_nowait((attempts + 1, entry))
+                requeued += 1
+            except queue.Full:
+                break
+        return requeued
+
+    def _write(self, batch: List[Tuple[int, Dict[str, Any]]]) -> bool:
+        if not batch: return True
+        supabase = get_supabase()
+        if supabase is None:
+            with self._lock: self.dropped += len(batch)
+            return True
+        try:
+            supabase.table('activity_logs').insert([entry for _, entry in batch]).execute()
+            with self._lock: self.written += len(batch)
+            return True
+        except Exception as e:
+            requeued = self._requeue(batch)
+            with self._lock:
+                self.failed_batches += 1
+                self.requeued += requeued
+                self.dropped += len(batch) - requeued
+            print(f"⚠️ Log Error: {str(e)} ({requeued}/{len(batch)} entri diantrikan ulang)")
+            return False
+
+    def flush(self):
+        """Kirim semua entri yang masih ada di antrian (background task setiap request yang mencatat log)."""
+        with self._flush_lock:
+            while True:
+                batch = self._drain(self.batch_size)
+                if not batch: break
+                # Batch gagal diulang sekali di flush yang sama, setelah jeda singkat
+                if not self._write(batch): time.sleep(self.retry_backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "queue_maxsize": self.queue.maxsize,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed_batches": self.failed_batches,
+                "requeued": self.requeued,
+            }
+
+audit_log_queue = AuditLogQueue(LOG_QUEUE_MAXSIZE, LOG_BATCH_SIZE)
+atexit.register(audit_log_queue.flush)
+
+@app.on_event("shutdown")
+def flush_audit_logs():
+    audit_log_queue.flush()
+
+def create_logs_bulk(entries: List[Dict[str, Any]]):
+    # Banyak log sekaligus (bulk action) langsung ditulis dalam satu insert
+    supabase = get_supabase()
+    if supabase is None or not entries: return
     try:
-        log_entry = {
-            "asset_id": asset_id,
-            "user_email": user_email,
-            "action": action,
-            "details": details,
-            "created_at": datetime.utcnow().isoformat()
-        }
-        supabase.table('activity_logs').insert(log_entry).execute()
+        supabase.table('activity_logs').insert(entries).execute()
     except Exception as e:
         print(f"⚠️ Log Error: {str(e)}")
 
+def create_log(background_tasks: BackgroundTasks, asset_id: str, user_email: str, action: str, details: str):
+    supabase = get_supabase()
+    if supabase is None: return
+    audit_log_queue.put({
+        "asset_id": asset_id,
+        "user_email": user_email,
+        "action": action,
+        "details": details,
+        "created_at": datetime.utcnow().isoformat()
+    })
+    # Dikosongkan setelah response dikirim, sebelum invocation selesai
+    background_tasks.add_task(audit_log_queue.flush)
+
 # --- 4. API ENDPOINTS ---
 
 @app.get("/")
@@ -120,7 +234,8 @@ def read_root():
 
 # --- A. FITUR INPUT ---
 @app.post("/api/assets/input", status_code=status.HTTP_201_CREATED)
-def input_new_asset(asset: AssetInput):
+def input_new_asset(asset: AssetInput, background_tasks: BackgroundTasks):
+    supabase = get_supabase()
     if supabase is None: raise HTTPException(503, "Database Offline")
     try:
         # Dump data - Pydantic sudah otomatis memaksa jadi INT di sini
@@ -145,7 +260,7 @@ def input_new_asset(asset: AssetInput):
         user_email = str(asset.input_by) if asset.input_by else "System Admin"
         asset_id = str(new_asset.get('id', ''))
         
-        create_log(asset_id, user_email, "CREATE", f"Input aset baru: {asset.no_aset}")
+        create_log(background_tasks, asset_id, user_email, "CREATE", f"Input aset baru: {asset.no_aset}")
         return {"success": True, "data": new_asset}
 
     except Exception as e:
@@ -154,42 +269,160 @@ def input_new_asset(asset: AssetInput):
 
 # --- B. FITUR LISTING ---
 @app.get("/api/assets/list")
-def get_all_assets():
-    if supabase is None: raise HTTPException(503, "Database Offline")
-    try:
-        response = supabase.table('attb_assets').select("*").order('created_at', desc=True).execute()
-        return response.data if response.data else []
-    except Exception as e:
-        print(f"❌ List Error: {e}")
-        raise HTTPException(500, f"Server Error: {str(e)}")
+def get_all_assets(response: Response):
+    def fetch():
+        res = require_supabase().table('attb_assets').select("*").order('created_at', desc=True).execute()
+        return res.data if res.data else []
+    return read_with_fallback("attb:assets:list", fetch, response)
 
 # --- C. FITUR UPDATE STATUS ---
+def versioned_update(supabase, asset_id: str, payload: Dict[str, Any], version: Optional[int]):
+    """
+    Update satu aset dalam satu round trip; baris hasil update langsung dikembalikan.
+    Jika `version` diisi, update hanya berlaku bila aset belum diubah user lain (409 jika sudah).
+    """
+    # Trigger di database juga menaikkan versi; diisi di sini agar hasilnya sama tanpa trigger
+    if version is not None: payload['version'] = version + 1
+    query = supabase.table('attb_assets').update(payload).eq('id', asset_id)
+    if version is not None: query = query.eq('version', version)
+    response = query.execute()
+    if not response.data:
+        if version is not None: raise HTTPException(409, "Aset sudah diubah user lain, muat ulang data")
+        raise HTTPException(404, "Aset tidak ditemukan")
+    return response
+
 @app.patch("/api/assets/{asset_id}/update_status")
-def update_asset_status(asset_id: str, update_data: AssetStatusUpdate):
+def update_asset_status(asset_id: str, update_data: AssetStatusUpdate, background_tasks: BackgroundTasks):
+    supabase = get_supabase()
     if supabase is None: raise HTTPException(503, "Database Offline")
     try:
-        response = supabase.table('attb_assets').update({
-                "current_step": update_data.current_step,
-                "status": update_data.status_text
-            }).eq('id', asset_id).execute()
-
-        if not response.data: raise HTTPException(404, "Aset tidak ditemukan")
+        payload: Dict[str, Any] = {
+            "current_step": update_data.current_step,
+            "status": update_data.status_text
+        }
+        response = versioned_update(supabase, asset_id, payload, update_data.version)
         data: Any = response.data[0]
-        create_log(asset_id, update_data.user_email or "Admin", "UPDATE_STATUS", f"Status -> {update_data.status_text}")
+        create_log(background_tasks, asset_id, update_data.user_email or "Admin", "UPDATE_STATUS", f"Status -> {update_data.status_text}")
         return {"message": "Status updated", "data": data}
+    except HTTPException: raise
     except Exception as e:
         print(f"❌ Update Status Error: {e}")
         raise HTTPException(500, "Gagal update status")
 
+# --- C2. FITUR BULK UPDATE STATUS ---
+BULK_MAX_ASSETS = 500
+BULK_IDEMPOTENCY_TTL = 600  # detik
+_bulk_results: Dict[str, Any] = {}
+_bulk_results_lock = threading.Lock()
+
+class AssetBulkStatusUpdate(BaseModel):
+    asset_ids: List[str]
+    current_step: int = Field(..., ge=1, le=6, description="Tahap tujuan")
+    status_text: str
+    no_surat: Optional[str] = None
+    user_email: Optional[str] = "Admin"
+    idempotency_key: Optional[str] = None
+
+def _bulk_surat_column(step: int) -> Optional[str]:
+    # Sama dengan halaman monitoring: AE-2..AE-4 punya kolom no_surat_aeN, tahap 5 = SK
+    if step <= 4: return f"no_surat_ae{step}"
+    if step == 5: return "no_surat_sk"
+    return None
+
+def _bulk_payload_hash(update_data: AssetBulkStatusUpdate, asset_ids: List[str]) -> str:
+    # Key yang sama hanya boleh mengulang payload yang sama (urutan aset tidak berpengaruh)
+    try: body = update_data.model_dump(exclude={"idempotency_key", "asset_ids"})
+    except: body = update_data.dict(exclude={"idempotency_key", "asset_ids"})
+    body["asset_ids"] = sorted(asset_ids)
+    return hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+@app.patch("/api/assets/bulk_update_status")
+def bulk_update_asset_status(update_data: AssetBulkStatusUpdate):
+    supabase = get_supabase()
+    if supabase is None: raise HTTPException(503, "Database Offline")
+    key = update_data.idempotency_key
+    asset_ids = list(dict.fromkeys(a.strip() for a in update_data.asset_ids if a and a.strip()))
+    payload_hash = _bulk_payload_hash(update_data, asset_ids)
+    if key:
+        with _bulk_results_lock:
+            cached = _bulk_results.get(key)
+            if cached and time.time() - cached[0] < BULK_IDEMPOTENCY_TTL:
+                if cached[1] != payload_hash:
+                    raise HTTPException(409, "idempotency_key sudah dipakai untuk payload yang berbeda")
+                return cached[2]
+
+    if not asset_ids: raise HTTPException(400, "Daftar aset kosong")
+    if len(asset_ids) > BULK_MAX_ASSETS: raise HTTPException(400, f"Maksimal {BULK_MAX_ASSETS} aset per batch")
+    target = update_data.current_step
+    try:
+        response = supabase.table('attb_assets').select("id, current_step").in_('id', asset_ids).execute()
+        current = {str(row.get('id')): int(row.get('current_step') or 1) for row in (response.data or [])}
+
+        results: Dict[str, Dict[str, Any]] = {}
+        movable: List[str] = []
+        for asset_id in asset_ids:
+            step = current.get(asset_id)
+            if step is None:
+                results[asset_id] = {"status": "not_found"}
+            elif step == target:
+                # Sudah di tahap tujuan (mis. retry dari client): tidak diubah, tidak di-log ulang
+                results[asset_id] = {"status": "unchanged", "current_step": step}
+            elif step + 1 != target:
+                results[asset_id] = {"status": "rejected", "current_step": step, "reason": f"Tahap {step} tidak bisa pindah ke Tahap {target}"}
+            else:
+                movable.append(asset_id)
+
+        if movable:
+            payload: Dict[str, Any] = {"current_step": target, "status": update_data.status_text}
+            surat_col = _bulk_surat_column(target)
+            if surat_col and update_data.no_surat: payload[surat_col] = update_data.no_surat
+            # Guard current_step agar request paralel tidak memindahkan aset dua kali
+            updated = supabase.table('attb_assets').update(payload) \
+                .in_('id', movable).eq('current_step', target - 1).execute()
+            updated_ids = {str(row.get('id')) for row in (updated.data or [])}
+            for asset_id in movable:
+                if asset_id in updated_ids:
+                    results[asset_id] = {"status": "updated", "current_step": target}
+                else:
+                    results[asset_id] = {"status": "conflict", "reason": "Tahap aset berubah saat diproses"}
+            if updated_ids:
+                user_email = update_data.user_email or "Admin"
+                now = datetime.utcnow().isoformat()
+                create_logs_bulk([{
+                    "asset_id": asset_id,
+                    "user_email": user_email,
+                    "action": "UPDATE_STATUS",
+                    "details": f"Status -> {update_data.status_text} (bulk)",
+                    "created_at": now
+                } for asset_id in asset_ids if asset_id in updated_ids])
+
+        results = {asset_id: results[asset_id] for asset_id in asset_ids}
+        counts: Dict[str, int] = {}
+        for r in results.values(): counts[r["status"]] = counts.get(r["status"], 0) + 1
+        result = {"message": "Bulk status processed", "summary": counts, "results": results}
+        if key:
+            with _bulk_results_lock:
+                now_ts = time.time()
+                for k in [k for k, v in _bulk_results.items() if now_ts - v[0] >= BULK_IDEMPOTENCY_TTL]:
+                    del _bulk_results[k]
+                _bulk_results[key] = (now_ts, payload_hash, result)
+        return result
+    except HTTPException: raise
+    except Exception as e:
+        print(f"❌ Bulk Update Status Error: {e}")
+        raise HTTPException(500, f"Gagal bulk update status: {str(e)}")
+
 # --- D. FITUR UPDATE DETAIL ---
 @app.patch("/api/assets/{asset_id}/update_details")
-def update_asset_details(asset_id: str, update_data: AssetDetailUpdate):
+def update_asset_details(asset_id: str, update_data: AssetDetailUpdate, background_tasks: BackgroundTasks):
+    supabase = get_supabase()
     if supabase is None: raise HTTPException(503, "Database Offline")
     try:
         try: payload = update_data.model_dump(exclude_unset=True)
         except: payload = update_data.dict(exclude_unset=True)
         
         user_email = payload.pop('user_email', 'Admin')
+        version = payload.pop('version', None)
         
         if not payload: return {"message": "No changes"}
 
@@ -197,13 +430,12 @@ def update_asset_details(asset_id: str, update_data: AssetDetailUpdate):
         if 'nilai_buku' in payload and payload['nilai_buku'] is not None:
              payload['nilai_buku'] = int(float(payload['nilai_buku']))
 
-        response = supabase.table('attb_assets').update(payload).eq('id', asset_id).execute()
-        
-        if not response.data: raise HTTPException(404, "Aset tidak ditemukan")
+        response = versioned_update(supabase, asset_id, payload, version)
         data: Any = response.data[0]
-        create_log(asset_id, str(user_email), "UPDATE_DETAILS", "Edit data teknis aset")
+        create_log(background_tasks, asset_id, str(user_email), "UPDATE_DETAILS", "Edit data teknis aset")
         return {"success": True, "data": data}
 
+    except HTTPException: raise
     except Exception as e:
         print(f"❌ Edit Error: {e}")
         raise HTTPException(500, f"Gagal edit aset: {str(e)}")
@@ -211,24 +443,367 @@ def update_asset_details(asset_id: str, update_data: AssetDetailUpdate):
 # --- E. FITUR DELETE ---
 @app.delete("/api/assets/{asset_id}")
 def delete_asset(asset_id: str, user_email: str = "Admin"):
+    supabase = get_supabase()
     if supabase is None: raise HTTPException(503, "Database Offline")
     try:
         clean_id = asset_id.strip()
-        try: supabase.table('activity_logs').delete().eq('asset_id', clean_id).execute()
-        except: pass 
-        supabase.table('attb_assets').delete().eq('id', clean_id).execute()
+        try:
+            # Log + aset dihapus dalam satu transaksi (lihat sql/asset_mutations.sql)
+            response = supabase.rpc('delete_asset_with_logs', {"p_asset_id": clean_id}).execute()
+        except Exception as e:
+            if not is_missing_function(e): raise
+            print("⚠️ RPC delete_asset_with_logs belum dipasang, pakai fallback")
+            try: supabase.table('activity_logs').delete().eq('asset_id', clean_id).execute()
+            except: pass 
+            response = supabase.table('attb_assets').delete().eq('id', clean_id).execute()
+        if not response.data: raise HTTPException(404, "Aset tidak ditemukan")
         return {"message": "Aset berhasil dihapus"}
+    except HTTPException: raise
     except Exception as e:
         print(f"❌ Delete Critical Error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Server Error: {str(e)}")
 
-# --- F. STATS ---
-@app.get("/api/dashboard/stats")
-def get_dashboard_stats():
+# --- E2. REVALUASI HARGA TAFSIRAN ---
+# Saat rate scrap (rupiah_per_kg) berubah, harga_tafsiran yang tersimpan ikut basi.
+# Seluruh konversi_kg dimuat ke array NumPy, harga baru dihitung sekaligus,
+# lalu hanya baris yang berubah yang ditulis balik secara batch per chunk.
+FETCH_PAGE_SIZE = 1000
+REVALUATION_CHUNK_SIZE = 1000
+
+class RevaluationRequest(BaseModel):
+    rupiah_per_kg: int = Field(..., gt=0, description="Rate baru default (Rp/kg)")
+    rate_per_jenis: Dict[str, PositiveInt] = Field(default_factory=dict, description="Rate khusus per jenis_aset")
+    rate_per_lokasi: Dict[str, PositiveInt] = Field(default_factory=dict, description="Rate khusus per lokasi (prioritas di atas jenis)")
+    jenis_aset: Optional[List[str]] = None
+    lokasi: Optional[List[str]] = None
+    user_email: Optional[str] = "Admin"
+
+def iter_table_pages(table: str, columns: str, page_size: int = FETCH_PAGE_SIZE, apply_filters=None):
+    """
+    Ambil isi tabel per halaman agar tidak terpotong limit baris PostgREST.
+    Paging keyset pada `id` (id > id terakhir), bukan OFFSET: baris baru yang
+    masuk selama iterasi tidak menggeser halaman sehingga tidak ada baris ganda/terlewat.
+    `columns` harus memuat id.
+    """
+    supabase = get_supabase()
+    if supabase is None: return
+    last_id = None
+    while True:
+        query = supabase.table(table).select(columns)
+        if apply_filters is not None: query = apply_filters(query)
+        if last_id is not None: query = query.gt('id', last_id)
+        response = query.order('id', desc=False).limit(page_size).execute()
+        rows: List[Any] = response.data or []
+        if rows: yield rows
+        if len(rows) < page_size: break
+        last_id = rows[-1].get('id')
+
+def _compute_revaluation(req: RevaluationRequest) -> Dict[str, Any]:
+    def apply_filters(query):
+        if req.jenis_aset: query = query.in_('jenis_aset', req.jenis_aset)
+        if req.lokasi: query = query.in_('lokasi', req.lokasi)
+        return query
+
+    ids: List[Any] = []
+    kg_parts, old_parts, old_rate_parts = [], [], []
+    jenis: List[str] = []
+    lokasi: List[str] = []
+    for rows in iter_table_pages('attb_assets', "id, konversi_kg, rupiah_per_kg, harga_tafsiran, jenis_aset, lokasi", apply_filters=apply_filters):
+        ids.extend(r.get('id') for r in rows)
+        kg_parts.append(np.array([float(r.get('konversi_kg') or 0) for r in rows], dtype=np.float64))
+        old_parts.append(np.array([int(float(r.get('harga_tafsiran') or 0)) for r in rows], dtype=np.int64))
+        old_rate_parts.append(np.array([int(float(r.get('rupiah_per_kg') or 0)) for r in rows], dtype=np.int64))
+        jenis.extend(str(r.get('jenis_aset') or "Lainnya") for r in rows)
+        lokasi.extend(str(r.get('lokasi') or "-") for r in rows)
+
+    kg = np.concatenate(kg_parts) if kg_parts else np.zeros(0, dtype=np.float64)
+    old_value = np.concatenate(old_parts) if old_parts else np.zeros(0, dtype=np.int64)
+    old_rate = np.concatenate(old_rate_parts) if old_rate_parts else np.zeros(0, dtype=np.int64)
+
+    rate = np.full(kg.shape[0], req.rupiah_per_kg, dtype=np.int64)
+    if req.rate_per_jenis:
+        jenis_arr = np.array(jenis, dtype=object)
+        for name, r in req.rate_per_jenis.items(): rate[jenis_arr == name] = r
+    if req.rate_per_lokasi:
+        lokasi_arr = np.array(lokasi, dtype=object)
+        for name, r in req.rate_per_lokasi.items(): rate[lokasi_arr == name] = r
+
+    # Sama seperti saat input: int(konversi_kg * rupiah_per_kg)
+    new_value = np.trunc(kg * rate).astype(np.int64)
+    changed = (new_value != old_value) | (rate != old_rate)
+    delta = new_value - old_value
+
+    by_jenis: Dict[str, Dict[str, int]] = {}
+    if kg.shape[0]:
+        keys, inverse = np.unique(np.array(jenis, dtype=object), return_inverse=True)
+        old_sum = np.bincount(inverse, weights=old_value, minlength=len(keys))
+        new_sum = np.bincount(inverse, weights=new_value, minlength=len(keys))
+        changed_count = np.bincount(inverse, weights=changed, minlength=len(keys))
+        for i, k in enumerate(keys):
+            by_jenis[str(k)] = {"old_total": int(old_sum[i]), "new_total": int(new_sum[i]), "changed": int(changed_count[i])}
+
+    return {
+        "ids": ids, "rate": rate, "new_value": new_value, "old_value": old_value, "changed": changed,
+        "summary": {
+            "total_assets": int(kg.shape[0]),
+            "changed_assets": int(changed.sum()),
+            "old_total": int(old_value.sum()),
+            "new_total": int(new_value.sum()),
+            "delta": int(delta.sum()),
+            "by_jenis_aset": by_jenis
+        }
+    }
+
+@app.post("/api/assets/revaluation/preview")
+def preview_revaluation(req: RevaluationRequest):
+    supabase = get_supabase()
+    if supabase is None: raise HTTPException(503, "Database Offline")
+    try:
+        return _compute_revaluation(req)["summary"]
+    except Exception as e:
+        print(f"❌ Revaluation Preview Error: {e}")
+        raise HTTPException(500, f"Gagal hitung revaluasi: {str(e)}")
+
+@app.post("/api/assets/revaluation/apply")
+def apply_revaluation(req: RevaluationRequest):
+    supabase = get_supabase()
     if supabase is None: raise HTTPException(503, "Database Offline")
     try:
-        response = supabase.table('attb_assets').select("jenis_aset, current_step, harga_tafsiran").execute()
-        data: List[Any] = response.data if response.data else []
+        result = _compute_revaluation(req)
+    except Exception as e:
+        print(f"❌ Revaluation Apply Error: {e}")
+        raise HTTPException(500, f"Gagal hitung revaluasi: {str(e)}")
+
+    idx = np.flatnonzero(result["changed"])
+    ids, rate, new_value, old_value = result["ids"], result["rate"], result["new_value"], result["old_value"]
+    user_email = req.user_email or "Admin"
+    # Satu ID per revaluasi; tercatat di setiap log aset agar hasil parsial bisa ditelusuri
+    revaluation_id = datetime.utcnow().strftime("REV-%Y%m%d%H%M%S%f")
+    chunks_total = (len(idx) + REVALUATION_CHUNK_SIZE - 1) // REVALUATION_CHUNK_SIZE
+    written = 0
+    for n, start in enumerate(range(0, len(idx), REVALUATION_CHUNK_SIZE), 1):
+        chunk = idx[start:start + REVALUATION_CHUNK_SIZE]
+        updates = [{"id": ids[i], "rupiah_per_kg": int(rate[i]), "harga_tafsiran": int(new_value[i]),
+                    "old_harga_tafsiran": int(old_value[i])} for i in chunk]
+        try:
+            # Satu panggilan RPC per chunk: update + log aktivitas dalam satu transaksi (lihat sql/revaluation.sql)
+            supabase.rpc('revalue_assets', {"updates": updates, "p_user_email": user_email,
+                                            "p_revaluation_id": revaluation_id}).execute()
+        except Exception as e:
+            print(f"❌ Revaluation Apply Error {revaluation_id} chunk {n}/{chunks_total}: {e}")
+            # Chunk sebelumnya sudah tersimpan; apply ulang hanya menulis aset yang masih berbeda
+            raise HTTPException(500, {
+                "message": f"Gagal simpan revaluasi: {str(e)}",
+                "revaluation_id": revaluation_id,
+                "updated": written,
+                "chunks_done": n - 1,
+                "chunks_total": chunks_total,
+            })
+        written += len(updates)
+        if n % 10 == 0 or n == chunks_total:
+            print(f"💰 Revaluasi {revaluation_id} oleh {user_email}: chunk {n}/{chunks_total}, {written}/{len(idx)} aset")
+    summary = result["summary"]
+    print(f"💰 Revaluasi {revaluation_id} selesai: {written} aset, delta Rp {summary['delta']}")
+    return {"success": True, "revaluation_id": revaluation_id, "updated": written,
+            "chunks": chunks_total, "summary": summary}
+
+# --- E3. EXPORT REGISTER ASET ---
+# Data diambil per halaman dan langsung ditulis ke output (CSV per baris,
+# XLSX lewat openpyxl write-only, Parquet per row group), sehingga memori
+# tetap konstan berapapun jumlah aset.
+TEMPLATE_ATTB_PATH = Path(__file__).resolve().parent.parent / 'public' / 'Template_ATTB.xlsx'
+EXPORT_HEADER_ROWS = 8  # Baris 1-8 template: kop, judul, header kolom & nomor kolom
+EXPORT_STREAM_CHUNK = 64 * 1024
+
+EXPORT_COLUMNS = [
+    "no_aset", "jenis_aset", "merk_type", "spesifikasi", "jumlah", "satuan", "konversi_kg",
+    "tahun_perolehan", "umur_pakai", "nilai_perolehan", "nilai_buku", "rupiah_per_kg",
+    "harga_tafsiran", "lokasi", "keterangan", "foto_url", "status", "current_step", "created_at"
+]
+
+def _split_kode(item: Dict[str, Any]):
+    # Sama dengan export di frontend: spesifikasi "[KODE: X] ..." -> jenis aset X
+    jenis = item.get('jenis_aset')
+    spesifikasi = str(item.get('spesifikasi') or "-")
+    if spesifikasi.startswith("[KODE:") and "]" in spesifikasi:
+        kode, rest = spesifikasi[len("[KODE:"):].split("]", 1)
+        jenis, spesifikasi = kode.strip(), rest.strip() or "-"
+    return jenis, spesifikasi
+
+def _template_row(no: int, item: Dict[str, Any]) -> List[Any]:
+    """Satu aset = satu baris, kolom B..T mengikuti Template_ATTB.xlsx."""
+    jenis, spesifikasi = _split_kode(item)
+    return [
+        None, no, item.get('no_aset'), jenis, item.get('merk_type'), spesifikasi,
+        item.get('jumlah'), item.get('satuan'), item.get('konversi_kg'),
+        item.get('tahun_perolehan'), item.get('umur_pakai'),
+        item.get('nilai_perolehan') or 0, None, item.get('nilai_buku') or 0, None,
+        item.get('rupiah_per_kg'), item.get('harga_tafsiran') or 0,
+        item.get('lokasi'), item.get('keterangan') or "-", item.get('foto_url') or "-"
+    ]
+
+def _copy_template_header(ws):
+    """Salin kop & header (nilai, style, lebar kolom, merge) dari template ke sheet write-only."""
+    if not TEMPLATE_ATTB_PATH.exists():
+        ws.append([None, "NO", "NO. ASET", "Jenis Aset Tetap", "Merk/Type", "Spesifikasi", "Jumlah", "Satuan",
+                   "Konversi ke (KG)", "Tahun Perolehan", "Umur Pakai", "Nilai Perolehan (Rp)", None,
+                   "Nilai Buku (Rp)", None, "Rupiah per kilogram", "Harga Taksiran(Rp)", "Lokasi ATTB",
+                   "Keterangan", "Dokumentasi"])
+        return
+    from openpyxl import load_workbook
+    from openpyxl.cell import WriteOnlyCell
+    template = load_workbook(TEMPLATE_ATTB_PATH).active
+    for letter, dim in template.column_dimensions.items():
+        ws.column_dimensions[letter].width = dim.width
+    for merged in template.merged_cells.ranges:
+        if merged.max_row <= EXPORT_HEADER_ROWS: ws.merged_cells.add(merged.coord)
+    for row in template.iter_rows(min_row=1, max_row=EXPORT_HEADER_ROWS):
+        out = []
+        for cell in row:
+            c = WriteOnlyCell(ws, value=cell.value)
+            if cell.has_style:
+                c.font, c.border, c.fill = copy(cell.font), copy(cell.border), copy(cell.fill)
+                c.alignment, c.number_format = copy(cell.alignment), cell.number_format
+            out.append(c)
+        ws.append(out)
+
+def write_assets_xlsx(pages, target) -> int:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Border, Side
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    # freeze_panes harus diset sebelum baris pertama ditulis (write-only)
+    ws.freeze_panes = f"A{EXPORT_HEADER_ROWS + 1 if TEMPLATE_ATTB_PATH.exists() else 2}"
+    _copy_template_header(ws)
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    money_cols = {12, 14, 16, 17}  # L, N, P, Q
+    # Style dihitung sekali per kolom; tiap sel cukup menyalin StyleArray-nya
+    # (set border/number_format per sel = lookup hash style yang mahal)
+    styles = {}
+    for col in range(2, 21):
+        proto = WriteOnlyCell(ws)
+        proto.border = border
+        if col in money_cols: proto.number_format = '#,##0'
+        styles[col] = proto._style
+    no = 0
+    for rows in pages:
+        for item in rows:
+            no += 1
+            out: List[Any] = [None]
+            for col, value in enumerate(_template_row(no, item)[1:], start=2):
+                c = WriteOnlyCell(ws, value=value)
+                c._style = copy(styles[col])
+                out.append(c)
+            ws.append(out)
+    wb.save(target)
+    return no
+
+def iter_assets_csv(pages):
+    import csv, io
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in pages:
+        for item in rows:
+            writer.writerow(["" if item.get(c) is None else item.get(c) for c in EXPORT_COLUMNS])
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0); buf.truncate(0)
+    if buf.tell(): yield buf.getvalue().encode("utf-8")
+
+# Tipe kolom Parquet ditetapkan di muka (bukan ditebak dari halaman pertama):
+# kolom yang kosong semua di halaman 1 atau angka 100 vs 100.5 antar halaman
+# tetap masuk ke tipe yang sama.
+EXPORT_INT_COLUMNS = {"jumlah", "tahun_perolehan", "umur_pakai", "nilai_perolehan", "nilai_buku",
+                      "rupiah_per_kg", "harga_tafsiran", "current_step"}
+EXPORT_FLOAT_COLUMNS = {"konversi_kg"}
+
+def _parquet_schema():
+    import pyarrow as pa
+    def column_type(c):
+        if c in EXPORT_INT_COLUMNS: return pa.int64()
+        if c in EXPORT_FLOAT_COLUMNS: return pa.float64()
+        return pa.string()
+    return pa.schema([(c, column_type(c)) for c in EXPORT_COLUMNS])
+
+def _parquet_value(column: str, value: Any) -> Any:
+    if value is None or value == "": return None
+    try:
+        if column in EXPORT_INT_COLUMNS: return int(float(value))
+        if column in EXPORT_FLOAT_COLUMNS: return float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(value)
+
+def write_assets_parquet(pages, target) -> int:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = _parquet_schema()
+    total = 0
+    with pq.ParquetWriter(target, schema, compression="snappy") as writer:
+        for rows in pages:
+            records = [{c: _parquet_value(c, item.get(c)) for c in EXPORT_COLUMNS} for item in rows]
+            writer.write_table(pa.Table.from_pylist(records, schema=schema))
+            total += len(rows)
+    return total
+
+def _stream_file_and_delete(path: str):
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(EXPORT_STREAM_CHUNK)
+                if not chunk: break
+                yield chunk
+    finally:
+        try: os.remove(path)
+        except OSError: pass
+
+@app.get("/api/assets/export")
+def export_assets(format: str = "xlsx", jenis_aset: Optional[str] = None, lokasi: Optional[str] = None):
+    supabase = get_supabase()
+    if supabase is None: raise HTTPException(503, "Database Offline")
+    fmt = format.lower()
+    if fmt not in ("xlsx", "csv", "parquet"): raise HTTPException(400, "Format harus xlsx, csv atau parquet")
+
+    def apply_filters(query):
+        if jenis_aset: query = query.eq('jenis_aset', jenis_aset)
+        if lokasi: query = query.eq('lokasi', lokasi)
+        return query
+
+    pages = iter_table_pages('attb_assets', "*", apply_filters=apply_filters)
+    filename = f"Register_ATTB_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    try:
+        if fmt == "csv":
+            return StreamingResponse(iter_assets_csv(pages), headers=headers, media_type="text/csv")
+
+        # XLSX/Parquet butuh file utuh (zip/footer), jadi ditulis ke file sementara lalu di-stream
+        fd, tmp_path = tempfile.mkstemp(suffix=f".{fmt}")
+        os.close(fd)
+        try:
+            if fmt == "xlsx":
+                write_assets_xlsx(pages, tmp_path)
+                media_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            else:
+                try: write_assets_parquet(pages, tmp_path)
+                except ImportError: raise HTTPException(501, "Export Parquet butuh paket pyarrow")
+                media_type = 'application/vnd.apache.parquet'
+        except Exception:
+            os.remove(tmp_path)
+            raise
+        return StreamingResponse(_stream_file_and_delete(tmp_path), headers=headers, media_type=media_type)
+    except HTTPException: raise
+    except Exception as e:
+        print(f"❌ Export Error: {e}")
+        raise HTTPException(500, f"Gagal export: {str(e)}")
+
+# --- F. STATS ---
+@app.get("/api/dashboard/stats")
+def get_dashboard_stats(response: Response):
+    def fetch():
+        res = require_supabase().table('attb_assets').select("jenis_aset, current_step, harga_tafsiran").execute()
+        data: List[Any] = res.data if res.data else []
         total_assets = len(data)
         total_value = sum(float(item.get('harga_tafsiran') or 0) for item in data)
         category_counts: Dict[str, int] = {}
@@ -245,19 +820,138 @@ def get_dashboard_stats():
             "by_category": [{"name": k, "value": v} for k,v in category_counts.items()],
             "by_status": [{"name": f"Tahap {k}", "value": v} for k,v in status_counts.items()]
         }
-    except Exception as e:
-        print(f"❌ Stats Error: {e}")
-        raise HTTPException(500, f"Gagal hitung statistik: {str(e)}")
+    # Request identik yang bersamaan berbagi satu full-table scan
+    return read_coalesced("attb:dashboard:stats", fetch, response)
+
+# --- F2. HEALTH ---
+@app.get("/health")
+def health_check(response: Response):
+    result = probe(lambda: require_supabase().table('attb_assets').select("id").limit(1).execute())
+    if result["database"] != "ok": response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return result
 
 # --- G. LOGS ---
+@app.get("/api/system/log-queue")
+def get_log_queue_stats():
+    return audit_log_queue.stats()
+
+
+LOGS_MAX_PAGE_SIZE = 200
+LOGS_BATCH_MAX_ASSETS = 200
+
+class AssetLogsBatchRequest(BaseModel):
+    asset_ids: List[str] = Field(..., description="Daftar ID aset")
+    limit_per_asset: int = Field(5, ge=1, le=50)
+
+def fetch_latest_logs_fallback(supabase, asset_ids: List[str], per_asset: int) -> List[Any]:
+    # Satu query IN yang dibatasi. Jika hasilnya terpotong, aset yang belum dapat
+    # `per_asset` log (kalah oleh aset yang ramai) diambil satu per satu agar grupnya lengkap.
+    cap = len(asset_ids) * per_asset * 4
+    rows = supabase.table('activity_logs').select("*") \
+        .in_('asset_id', asset_ids) \
+        .order('created_at', desc=True) \
+        .limit(cap) \
+        .execute().data or []
+    if len(rows) < cap: return rows
+    counts: Dict[str, int] = {}
+    for row in rows:
+        key = str(row.get('asset_id'))
+        counts[key] = counts.get(key, 0) + 1
+    short = [a for a in asset_ids if counts.get(a, 0) < per_asset]
+    refetch = set(short)
+    rows = [row for row in rows if str(row.get('asset_id')) not in refetch]
+    for asset_id in short:
+        rows += supabase.table('activity_logs').select("*").eq('asset_id', asset_id) \
+            .order('created_at', desc=True).limit(per_asset).execute().data or []
+    return rows
+
+@app.post("/api/assets/logs/batch")
+def get_asset_logs_batch(req: AssetLogsBatchRequest):
+    # Ambil N log terbaru untuk banyak aset sekaligus dalam satu query
+    asset_ids = list(dict.fromkeys(a.strip() for a in req.asset_ids if a and a.strip()))
+    if len(asset_ids) > LOGS_BATCH_MAX_ASSETS:
+        raise HTTPException(400, f"Maksimal {LOGS_BATCH_MAX_ASSETS} aset per request")
+    grouped: Dict[str, List[Any]] = {a: [] for a in asset_ids}
+    supabase = get_supabase()
+    if supabase is None or not asset_ids: return grouped
+    try:
+        try:
+            # Jalur utama: fungsi SQL dengan LATERAL ... LIMIT per aset (lihat sql/asset_logs_batch.sql)
+            response = supabase.rpc('get_latest_asset_logs', {
+                "asset_ids": asset_ids,
+                "per_asset": req.limit_per_asset
+            }).execute()
+            rows: List[Any] = response.data or []
+        except Exception as e:
+            if not is_missing_function(e): raise
+            print("⚠️ RPC get_latest_asset_logs belum dipasang, pakai fallback")
+            rows = fetch_latest_logs_fallback(supabase, asset_ids, req.limit_per_asset)
+        for row in rows:
+            key = str(row.get('asset_id'))
+            if key in grouped and len(grouped[key]) < req.limit_per_asset:
+                grouped[key].append(row)
+        return grouped
+    except Exception as e:
+        print(f"❌ Batch Logs Error: {e}")
+        raise HTTPException(500, f"Gagal ambil log: {str(e)}")
+
 @app.get("/api/assets/{asset_id}/logs")
-def get_asset_logs(asset_id: str):
+def get_asset_logs(asset_id: str, limit: int = 50, offset: int = 0):
+    supabase = get_supabase()
     if supabase is None: return []
+    limit = max(1, min(limit, LOGS_MAX_PAGE_SIZE))
+    offset = max(0, offset)
     try:
-        response = supabase.table('activity_logs').select("*").eq('asset_id', asset_id).order('created_at', desc=True).execute()
+        response = supabase.table('activity_logs').select("*").eq('asset_id', asset_id) \
+            .order('created_at', desc=True) \
+            .range(offset, offset + limit - 1) \
+            .execute()
         return response.data if response.data else []
     except: return []
 
+# --- LOG AKTIVITAS: RIWAYAT, ROLLUP & RETENSI ---
+# Entri lebih tua dari SIPRIMA_LOG_RETENTION_DAYS dipindah ke arsip + rollup harian
+# (lihat siprima_core/retention.py dan sql/activity_retention.sql)
+LOGS_HISTORY_MAX_LIMIT = 500
+LOGS_DAILY_MAX_DAYS = 366
+
+@app.get("/api/logs/history")
+def get_logs_history(asset_id: Optional[str] = None, user_email: Optional[str] = None, action: Optional[str] = None,
+                     start: Optional[str] = None, end: Optional[str] = None, limit: int = 50, before: Optional[str] = None):
+    # Riwayat lengkap (tabel + arsip); /api/assets/{id}/logs tetap untuk log terbaru
+    try:
+        start_day, end_day = parse_day(start), parse_day(end)
+    except ValueError:
+        raise HTTPException(400, "Format tanggal harus YYYY-MM-DD")
+    limit = max(1, min(limit, LOGS_HISTORY_MAX_LIMIT))
+    filters = {"asset_id": asset_id, "user_email": user_email, "action": action}
+    return query_logs(require_supabase(), 'activity_logs', start_day, end_day, filters, limit, before)
+
+@app.get("/api/logs/daily")
+def get_logs_daily(start: str, end: Optional[str] = None):
+    try:
+        start_day: Any = parse_day(start)
+        end_day: Any = parse_day(end, datetime.utcnow().date() + timedelta(days=1))
+    except ValueError:
+        raise HTTPException(400, "Format tanggal harus YYYY-MM-DD")
+    if (end_day - start_day).days > LOGS_DAILY_MAX_DAYS: raise HTTPException(400, f"Rentang maksimal {LOGS_DAILY_MAX_DAYS} hari")
+    return daily_counts(require_supabase(), 'activity_logs', start_day, end_day)
+
+@app.get("/api/system/logs/compact")
+def compact_activity_logs(authorization: Optional[str] = Header(None)):
+    # Menghapus data: hanya untuk Vercel Cron (GET + Authorization: Bearer <CRON_SECRET>), lihat vercel.json
+    if not cron_authorized(authorization): raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Unauthorized")
+    # Kosongkan antrian dulu agar tidak ada log lama yang masih tertahan di memori
+    audit_log_queue.flush()
+    try:
+        return compact_logs(require_supabase(), 'activity_logs', today=datetime.utcnow().date())
+    except DatabaseUnavailable: raise
+    except ArchiveUnavailable as e:
+        raise HTTPException(status.HTTP_503_SERVICE_UNAVAILABLE, str(e))
+    except Exception as e:
+        print(f"❌ Compact Logs Error: {e}")
+        raise HTTPException(500, f"Gagal kompaksi log: {str(e)}")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
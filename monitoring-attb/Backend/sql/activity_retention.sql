@@ -0,0 +1,37 @@
+-- Retensi log aktivitas: rollup harian per user per aksi untuk entri yang sudah
+-- dipindah ke arsip (lihat siprima_core/retention.py).
+-- Jalankan sekali di Supabase SQL Editor.
+
+create table if not exists public.activity_daily_rollups (
+    source text not null,          -- nama tabel log asal
+    day date not null,
+    user_email text not null,
+    action text not null,
+    count integer not null,
+    primary key (source, day, user_email, action)
+);
+
+-- Kompaksi mencari entri tertua & mengambil per hari berdasarkan created_at
+create index if not exists activity_logs_created_idx
+    on public.activity_logs (created_at);
+
+-- Bucket privat untuk arsip JSONL ter-gzip (SIPRIMA_ARCHIVE_STORE=storage,
+-- SIPRIMA_ARCHIVE_BUCKET)
+insert into storage.buckets (id, name, public)
+values ('log-archive', 'log-archive', false)
+on conflict (id) do nothing;
+
+-- Backend ATTB memakai anon key, jadi RLS storage.objects harus mengizinkan
+-- baca (verifikasi & riwayat) serta upload dengan upsert (insert + update)
+-- di bucket arsip. Hanya bucket ini; bucket lain tidak ikut terbuka.
+drop policy if exists "log_archive_select" on storage.objects;
+create policy "log_archive_select" on storage.objects
+    for select to anon using (bucket_id = 'log-archive');
+
+drop policy if exists "log_archive_insert" on storage.objects;
+create policy "log_archive_insert" on storage.objects
+    for insert to anon with check (bucket_id = 'log-archive');
+
+drop policy if exists "log_archive_update" on storage.objects;
+create policy "log_archive_update" on storage.objects
+    for update to anon using (bucket_id = 'log-archive') with check (bucket_id = 'log-archive');
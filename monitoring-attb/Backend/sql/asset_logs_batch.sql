@@ -0,0 +1,28 @@
+-- Log terbaru per aset untuk endpoint POST /api/assets/logs/batch.
+-- Jalankan sekali di Supabase SQL Editor.
+
+-- Index agar pencarian log per aset (dan paginasi) tidak men-scan seluruh tabel
+create index if not exists activity_logs_asset_created_idx
+    on public.activity_logs (asset_id, created_at desc);
+
+-- ID dari API berupa teks; dikonversi ke tipe kolom asset_id lewat
+-- jsonb_populate_record (bukan kolomnya yang di-cast ke text) agar
+-- perbandingan di subquery LATERAL tetap memakai index di atas.
+create or replace function public.get_latest_asset_logs(asset_ids text[], per_asset int default 5)
+returns setof public.activity_logs
+language sql
+stable
+as $$
+    select l.*
+    from unnest(asset_ids) as a(raw_id)
+    cross join lateral (
+        select (jsonb_populate_record(null::public.activity_logs, jsonb_build_object('asset_id', a.raw_id))).asset_id as id
+    ) k
+    cross join lateral (
+        select *
+        from public.activity_logs
+        where activity_logs.asset_id = k.id
+        order by created_at desc
+        limit per_asset
+    ) l;
+$$;
@@ -0,0 +1,37 @@
+-- Jalur tulis tabel attb_assets: versi baris (optimistic concurrency) dan
+-- hapus aset + log-nya dalam satu round trip untuk DELETE /api/assets/{id}.
+-- Jalankan sekali di Supabase SQL Editor.
+
+alter table public.attb_assets add column if not exists version integer not null default 1;
+
+-- Setiap update menaikkan versi, termasuk bulk update & revaluasi
+create or replace function public.bump_row_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.version := old.version + 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists attb_assets_bump_version on public.attb_assets;
+create trigger attb_assets_bump_version
+    before update on public.attb_assets
+    for each row execute function public.bump_row_version();
+
+-- Log dihapus lebih dulu (FK activity_logs.asset_id), lalu asetnya; satu transaksi.
+-- Parameter memakai tipe kolom id (%TYPE) agar kedua delete memakai index,
+-- bukan meng-cast kolomnya ke text. Signature lama (text) dihapus lebih dulu.
+drop function if exists public.delete_asset_with_logs(text);
+
+create or replace function public.delete_asset_with_logs(p_asset_id public.attb_assets.id%TYPE)
+returns setof public.attb_assets
+language plpgsql
+as $$
+begin
+    delete from public.activity_logs where asset_id = p_asset_id;
+    return query
+        delete from public.attb_assets where id = p_asset_id returning *;
+end;
+$$;
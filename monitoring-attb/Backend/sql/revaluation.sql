@@ -0,0 +1,38 @@
+-- Tulis hasil revaluasi harga_tafsiran per chunk untuk POST /api/assets/revaluation/apply.
+-- Jalankan sekali di Supabase SQL Editor.
+
+-- Signature lama (tanpa user & id revaluasi) dihapus agar panggilan RPC tidak ambigu
+drop function if exists public.revalue_assets(jsonb);
+
+-- Update aset + satu log REVALUATION per aset dalam satu statement (satu transaksi
+-- per chunk). ID dari API berupa teks; dikonversi ke tipe kolom id lewat
+-- jsonb_populate_record agar join ke attb_assets tetap memakai primary key.
+create or replace function public.revalue_assets(updates jsonb, p_user_email text default 'Admin',
+                                                 p_revaluation_id text default null)
+returns integer
+language sql
+as $$
+    with u as (
+        select k.id, x.rupiah_per_kg, x.harga_tafsiran, x.old_harga_tafsiran
+        from jsonb_to_recordset(updates)
+            as x(id text, rupiah_per_kg bigint, harga_tafsiran bigint, old_harga_tafsiran bigint)
+        cross join lateral (
+            select (jsonb_populate_record(null::public.attb_assets, jsonb_build_object('id', x.id))).id
+        ) k
+    ), changed as (
+        update public.attb_assets a
+        set rupiah_per_kg = u.rupiah_per_kg,
+            harga_tafsiran = u.harga_tafsiran
+        from u
+        where a.id = u.id
+        returning a.id, u.rupiah_per_kg, u.harga_tafsiran, u.old_harga_tafsiran
+    ), logged as (
+        insert into public.activity_logs (asset_id, user_email, action, details, created_at)
+        select id, p_user_email, 'REVALUATION',
+               format('Harga tafsiran Rp %s -> Rp %s (Rp %s/kg, %s)',
+                      old_harga_tafsiran, harga_tafsiran, rupiah_per_kg, coalesce(p_revaluation_id, '-')),
+               now()
+        from changed
+    )
+    select count(*)::integer from changed;
+$$;
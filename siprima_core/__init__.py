@@ -0,0 +1,63 @@
+"""Inti akses data bersama untuk backend SiJAGAD dan Monitoring ATTB."""
+from .coalesce import SingleFlight, coalesce, single_flight
+from .cron import cron_authorized
+from .db import (
+    call_timeout,
+    get_http_client,
+    get_supabase,
+    is_missing_function,
+    load_env,
+    pool_info,
+    set_supabase,
+    use_credentials,
+)
+from .resilience import (
+    DatabaseUnavailable,
+    db_breaker,
+    is_database_error,
+    probe,
+    read_coalesced,
+    read_with_fallback,
+    snapshot_cache,
+)
+from .retention import (
+    ArchiveUnavailable,
+    LogArchive,
+    compact_logs,
+    daily_counts,
+    parse_day,
+    query_logs,
+    set_archive_store,
+)
+from .snapshots import get_snapshot_store, set_snapshot_store
+
+__all__ = [
+    "ArchiveUnavailable",
+    "DatabaseUnavailable",
+    "LogArchive",
+    "SingleFlight",
+    "call_timeout",
+    "coalesce",
+    "compact_logs",
+    "cron_authorized",
+    "daily_counts",
+    "db_breaker",
+    "get_http_client",
+    "get_snapshot_store",
+    "get_supabase",
+    "is_database_error",
+    "is_missing_function",
+    "load_env",
+    "parse_day",
+    "pool_info",
+    "probe",
+    "query_logs",
+    "read_coalesced",
+    "read_with_fallback",
+    "set_archive_store",
+    "set_snapshot_store",
+    "set_supabase",
+    "single_flight",
+    "snapshot_cache",
+    "use_credentials",
+]
@@ -0,0 +1,103 @@
+"""
+Single-flight: request identik yang datang bersamaan berbagi satu komputasi.
+
+Request pertama untuk sebuah key menjadi "leader" dan menjalankan fungsi;
+request lain dengan key yang sama menunggu dan menerima hasil (atau error)
+yang sama. Setelah selesai, hasil masih dipakai ulang selama `reuse_seconds`
+agar gelombang request yang datang sedikit terlambat tidak memicu scan ulang.
+"""
+import os
+import time
+import threading
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+COALESCE_REUSE_SECONDS = float(os.environ.get("SIPRIMA_COALESCE_REUSE_SECONDS") or 2)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "finished_at", "reuse")
+
+    def __init__(self, reuse: float):
+        self.reuse = reuse
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.finished_at: Optional[float] = None
+
+
+class SingleFlight:
+    def __init__(self, reuse_seconds: float = COALESCE_REUSE_SECONDS):
+        self.reuse_seconds = reuse_seconds
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable[[], Any], reuse_seconds: Optional[float] = None) -> Any:
+        reuse = self.reuse_seconds if reuse_seconds is None else reuse_seconds
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None and call.finished_at is not None and time.monotonic() - call.finished_at > call.reuse:
+                call = None
+            leader = call is None
+            if leader:
+                call = _Call(reuse)
+                self._calls[key] = call
+                self.executions += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None: raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+        finally:
+            with self._lock:
+                call.finished_at = time.monotonic()
+                # Error tidak dipakai ulang setelah request yang sedang menunggu dilayani
+                if call.error is not None or reuse <= 0:
+                    if self._calls.get(key) is call: del self._calls[key]
+                self._prune()
+            call.done.set()
+        if call.error is not None: raise call.error
+        return call.result
+
+    def forget(self, *keys: str):
+        """Buang hasil selesai yang masih dipakai ulang (mis. karena datanya baru saja berubah)."""
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is not None and call.finished_at is not None: del self._calls[key]
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [k for k, c in self._calls.items()
+                   if c.finished_at is not None and now - c.finished_at > c.reuse]
+        for k in expired: del self._calls[k]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"executions": self.executions, "shared": self.shared, "in_flight": sum(1 for c in self._calls.values() if c.finished_at is None)}
+
+
+single_flight = SingleFlight()
+
+
+def coalesce(key: Optional[Callable[..., str]] = None, reuse_seconds: Optional[float] = None, flight: Optional[SingleFlight] = None):
+    """
+    Decorator single-flight. `key(*args, **kwargs)` menentukan request mana yang
+    dianggap identik; default: nama fungsi + semua argumen.
+    """
+    def decorator(fn: Callable[..., Any]):
+        @wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any):
+            k = key(*args, **kwargs) if key is not None else f"{fn.__module__}.{fn.__qualname__}:{args!r}:{sorted(kwargs.items())!r}"
+            return (flight or single_flight).do(k, lambda: fn(*args, **kwargs), reuse_seconds)
+        return wrapper
+    return decorator
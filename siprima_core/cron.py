@@ -0,0 +1,16 @@
+"""
+Otorisasi endpoint cron.
+
+Vercel Cron mengirim `Authorization: Bearer <CRON_SECRET>`. Endpoint yang
+mengubah atau menghapus data lewat cron wajib memeriksa header ini; jika
+CRON_SECRET belum diset, semua permintaan ditolak.
+"""
+import hmac
+import os
+from typing import Optional
+
+
+def cron_authorized(authorization: Optional[str]) -> bool:
+    secret = os.environ.get("CRON_SECRET")
+    if not secret or not authorization: return False
+    return hmac.compare_digest(authorization.encode("utf-8"), f"Bearer {secret}".encode("utf-8"))
@@ -0,0 +1,187 @@
+"""
+Akses database bersama untuk backend SiJAGAD & Monitoring ATTB.
+
+Satu proses = satu client Supabase, dibuat saat pertama kali dipakai
+(bukan saat import). Client memakai satu httpx.Client ber-pool
+(HTTP/2 + keep-alive) sehingga koneksi TLS ke Supabase dipakai ulang
+antar request, dengan timeout per panggilan dan retry otomatis untuk
+pembacaan (GET/HEAD) yang gagal karena jaringan atau 502/503/504.
+"""
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union, Any, Dict, Tuple
+
+import httpx
+from dotenv import load_dotenv, find_dotenv
+from supabase import create_client, Client
+from supabase.lib.client_options import SyncClientOptions
+
+
+DB_CONNECT_TIMEOUT = float(os.environ.get("SIPRIMA_DB_CONNECT_TIMEOUT") or 5)
+DB_READ_TIMEOUT = float(os.environ.get("SIPRIMA_DB_READ_TIMEOUT") or 15)
+DB_POOL_SIZE = int(os.environ.get("SIPRIMA_DB_POOL_SIZE") or 20)
+DB_KEEPALIVE_EXPIRY = float(os.environ.get("SIPRIMA_DB_KEEPALIVE_EXPIRY") or 60)
+DB_READ_RETRIES = int(os.environ.get("SIPRIMA_DB_READ_RETRIES") or 2)
+DB_RETRY_BACKOFF = float(os.environ.get("SIPRIMA_DB_RETRY_BACKOFF") or 0.2)
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RETRY_STATUS_CODES = {502, 503, 504}
+
+_call_timeout: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("siprima_call_timeout", default=None)
+_lock = threading.RLock()
+_http_client: Optional[httpx.Client] = None
+_client: Optional[Client] = None
+_credential_env: Optional[Tuple[str, str]] = None
+_missing_credentials_reported = False
+
+
+def load_env(*paths: Union[str, Path]):
+    """Muat file .env yang ada (tanpa menimpa env yang sudah diset), lalu .env di cwd."""
+    for p in paths:
+        if p and Path(p).exists(): load_dotenv(dotenv_path=p)
+    load_dotenv(find_dotenv(usecwd=True))
+
+
+def use_credentials(url_var: str, key_var: str):
+    """
+    Tentukan pasangan env (URL, key) Supabase untuk proses ini; dipanggil entry point
+    sebelum get_supabase(). SiJAGAD: SUPABASE_URL + SUPABASE_SERVICE_KEY,
+    ATTB: NEXT_PUBLIC_SUPABASE_URL + NEXT_PUBLIC_SUPABASE_ANON_KEY (RLS tetap berlaku).
+    """
+    global _credential_env, _missing_credentials_reported
+    with _lock:
+        _credential_env = (url_var, key_var)
+        _missing_credentials_reported = False
+
+
+@contextmanager
+def call_timeout(seconds: float):
+    """
+    Batasi waktu setiap panggilan database di dalam blok ini. Batas berlaku untuk
+    satu panggilan termasuk retry-nya, bukan per percobaan.
+    """
+    token = _call_timeout.set(seconds)
+    try:
+        yield
+    finally:
+        _call_timeout.reset(token)
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Transport ber-pool yang menerapkan timeout per panggilan dan retry baca idempoten."""
+
+    def __init__(self, retries: int = DB_READ_RETRIES, backoff: float = DB_RETRY_BACKOFF, **kwargs: Any):
+        self.retries = retries
+        self.backoff = backoff
+        # retries=1 di HTTPTransport hanya mengulang kegagalan connect (aman untuk semua method)
+        self._transport = httpx.HTTPTransport(retries=1, **kwargs)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        seconds = _call_timeout.get()
+        deadline = time.monotonic() + seconds if seconds is not None else None
+        attempts = 1 + (self.retries if request.method in IDEMPOTENT_METHODS else 0)
+        for attempt in range(attempts):
+            if deadline is not None:
+                # Setiap percobaan hanya mendapat sisa waktu panggilan
+                remaining = max(deadline - time.monotonic(), 0.001)
+                request.extensions["timeout"] = httpx.Timeout(remaining, connect=min(remaining, DB_CONNECT_TIMEOUT)).as_dict()
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError:
+                if not self._may_retry(attempt, attempts, deadline): raise
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or not self._may_retry(attempt, attempts, deadline):
+                    return response
+                response.close()
+            time.sleep(self.backoff * (2 ** attempt))
+        raise RuntimeError("unreachable")
+
+    def _may_retry(self, attempt: int, attempts: int, deadline: Optional[float]) -> bool:
+        # Retry hanya jika masih ada jatah percobaan dan backoff-nya selesai sebelum batas waktu
+        if attempt == attempts - 1: return False
+        return deadline is None or time.monotonic() + self.backoff * (2 ** attempt) < deadline
+
+    def close(self):
+        self._transport.close()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_http_client() -> httpx.Client:
+    """httpx.Client bersama (satu per proses) untuk Supabase maupun HTTP lain."""
+    global _http_client
+    if _http_client is None:
+        with _lock:
+            if _http_client is None:
+                http2 = _http2_available()
+                limits = httpx.Limits(max_connections=DB_POOL_SIZE, max_keepalive_connections=DB_POOL_SIZE,
+                                      keepalive_expiry=DB_KEEPALIVE_EXPIRY)
+                _http_client = httpx.Client(
+                    http2=http2,
+                    timeout=httpx.Timeout(DB_READ_TIMEOUT, connect=DB_CONNECT_TIMEOUT),
+                    transport=RetryTransport(http2=http2, limits=limits),
+                    follow_redirects=True,
+                )
+    return _http_client
+
+
+def get_supabase() -> Optional[Client]:
+    """Client Supabase bersama; None jika kredensial belum diset atau client gagal dibuat."""
+    global _client, _missing_credentials_reported
+    if _client is not None: return _client
+    with _lock:
+        if _client is not None: return _client
+        if _credential_env is None:
+            if not _missing_credentials_reported:
+                print("❌ ERROR: use_credentials() belum dipanggil; env Supabase tidak diketahui.")
+                _missing_credentials_reported = True
+            return None
+        url_var, key_var = _credential_env
+        url, key = os.environ.get(url_var) or "", os.environ.get(key_var) or ""
+        if not url or not key:
+            if not _missing_credentials_reported:
+                print(f"❌ ERROR: {url_var}/{key_var} tidak ditemukan. Cek file .env Anda.")
+                _missing_credentials_reported = True
+            return None
+        try:
+            options = SyncClientOptions(httpx_client=get_http_client())
+            _client = create_client(url, key, options=options)
+        except Exception as e:
+            print(f"⚠️ Warning: Gagal koneksi ke Supabase: {e}")
+            return None
+    return _client
+
+
+def is_missing_function(exc: BaseException) -> bool:
+    """True jika error PostgREST berarti fungsi RPC belum dipasang (bukan error lain)."""
+    if getattr(exc, "code", None) in ("PGRST202", "42883"): return True
+    return "Could not find the function" in str(exc)
+
+
+def set_supabase(client: Optional[Any]):
+    """Ganti client bersama (mis. stand-in lokal untuk benchmark/load test)."""
+    global _client
+    with _lock:
+        _client = client
+
+
+def pool_info() -> Dict[str, Any]:
+    return {
+        "http2": _http2_available(),
+        "pool_size": DB_POOL_SIZE,
+        "keepalive_expiry": DB_KEEPALIVE_EXPIRY,
+        "connect_timeout": DB_CONNECT_TIMEOUT,
+        "read_timeout": DB_READ_TIMEOUT,
+        "read_retries": DB_READ_RETRIES,
+        "initialized": _client is not None,
+    }
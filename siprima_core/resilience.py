@@ -0,0 +1,251 @@
+"""
+Circuit breaker + cache snapshot untuk pembacaan database.
+
+Jika Supabase lambat atau mati, breaker terbuka setelah beberapa kegagalan
+(atau panggilan lambat) berturut-turut. Selama terbuka, endpoint baca tidak
+lagi menunggu timeout upstream, tetapi langsung menyajikan snapshot terakhir
+yang berhasil dari cache lokal (memori + disk), ditandai header
+X-Data-Stale / X-Data-Age.
+
+Yang dihitung sebagai kegagalan database hanya error transport/timeout dan
+error PostgREST dari `.execute()`. Exception lain (mis. bug saat mengolah
+baris) tidak menyentuh breaker dan tetap naik sebagai 500.
+"""
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+from postgrest.exceptions import APIError
+
+from .coalesce import SingleFlight, single_flight
+from .db import call_timeout
+
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("SIPRIMA_BREAKER_FAILURES") or 3)
+BREAKER_SLOW_CALL_SECONDS = float(os.environ.get("SIPRIMA_BREAKER_SLOW_SECONDS") or 5)
+BREAKER_OPEN_SECONDS = float(os.environ.get("SIPRIMA_BREAKER_OPEN_SECONDS") or 30)
+BREAKER_CALL_TIMEOUT = float(os.environ.get("SIPRIMA_BREAKER_CALL_TIMEOUT") or 10)
+CACHE_DIR = Path(os.environ.get("SIPRIMA_CACHE_DIR") or Path(tempfile.gettempdir()) / "siprima_cache")
+CACHE_PERSIST_SECONDS = float(os.environ.get("SIPRIMA_CACHE_PERSIST_SECONDS") or 30)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class DatabaseUnavailable(Exception):
+    """Database tidak bisa dipakai dan tidak ada snapshot untuk disajikan."""
+
+
+def is_database_error(exc: BaseException) -> bool:
+    """True untuk kegagalan di sisi database/jaringan, bukan di kode pengolah data."""
+    return isinstance(exc, (httpx.TransportError, APIError, DatabaseUnavailable))
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 slow_call_seconds: float = BREAKER_SLOW_CALL_SECONDS,
+                 open_seconds: float = BREAKER_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.last_latency_ms: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self.state == STATE_CLOSED: return True
+            if self.state == STATE_OPEN:
+                if self.opened_at is not None and time.monotonic() - self.opened_at >= self.open_seconds:
+                    self.state = STATE_HALF_OPEN
+                else:
+                    return False
+            # Half-open: hanya satu request percobaan yang boleh lewat
+            if self._probe_in_flight: return False
+            self._probe_in_flight = True
+            return True
+
+    def _trip(self):
+        self.state = STATE_OPEN
+        self.opened_at = time.monotonic()
+        print(f"🔌 Circuit breaker OPEN: {self.last_error}")
+
+    def record_success(self, latency: float):
+        with self._lock:
+            self._probe_in_flight = False
+            self.last_latency_ms = round(latency * 1000, 1)
+            if latency >= self.slow_call_seconds:
+                # Latency spike dihitung sebagai kegagalan walaupun datanya tetap dipakai
+                self.last_error = f"slow call {self.last_latency_ms} ms"
+                self.consecutive_failures += 1
+                if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold: self._trip()
+                return
+            if self.state != STATE_CLOSED: print("🔌 Circuit breaker CLOSED")
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+
+    def release_probe(self):
+        # Request percobaan selesai tanpa hasil yang relevan untuk status database
+        with self._lock: self._probe_in_flight = False
+
+    def record_failure(self, error: Exception):
+        with self._lock:
+            self._probe_in_flight = False
+            self.last_error = str(error)[:200]
+            self.consecutive_failures += 1
+            if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold: self._trip()
+
+    def call(self, fn: Callable[[], Any], timeout: float = BREAKER_CALL_TIMEOUT) -> Any:
+        if not self.allow_request(): raise DatabaseUnavailable("Circuit breaker open")
+        started = time.monotonic()
+        try:
+            with call_timeout(timeout):
+                result = fn()
+        except Exception as e:
+            if is_database_error(e): self.record_failure(e)
+            else: self.release_probe()
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            retry_in = None
+            if self.state == STATE_OPEN and self.opened_at is not None:
+                retry_in = max(0.0, round(self.open_seconds - (time.monotonic() - self.opened_at), 1))
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "last_error": self.last_error,
+                "last_latency_ms": self.last_latency_ms,
+                "retry_in_seconds": retry_in,
+            }
+
+
+class SnapshotCache:
+    """Snapshot terakhir yang berhasil per key, di memori dan di disk (bertahan antar restart)."""
+
+    def __init__(self, directory: Path = CACHE_DIR, persist_seconds: float = CACHE_PERSIST_SECONDS):
+        self.directory = Path(directory)
+        self.persist_seconds = persist_seconds
+        self._memory: Dict[str, Tuple[float, Any]] = {}
+        self._persisted_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+    def put(self, key: str, data: Any):
+        saved_at = time.time()
+        with self._lock:
+            # Hasil single-flight yang sama (objek identik) tidak perlu ditulis ulang
+            current = self._memory.get(key)
+            if current is not None and current[1] is data: return
+            self._memory[key] = (saved_at, data)
+            # Salinan disk hanya untuk bertahan antar restart; cukup diperbarui berkala
+            if saved_at - self._persisted_at.get(key, 0.0) < self.persist_seconds: return
+            self._persisted_at[key] = saved_at
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # json.dumps (encoder C), bukan json.dump yang meng-encode potongan demi potongan di Python
+            payload = json.dumps({"key": key, "saved_at": saved_at, "data": data}, default=str)
+            # File sementara unik per penulis agar request paralel tidak saling menimpa
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(payload)
+            os.replace(tmp, self._path(key))
+        except Exception as e:
+            print(f"⚠️ Cache Write Error: {e}")
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            if key in self._memory: return self._memory[key]
+        try:
+            payload = json.loads(self._path(key).read_text())
+        except (OSError, ValueError):
+            return None
+        entry = (float(payload["saved_at"]), payload["data"])
+        with self._lock: self._memory[key] = entry
+        return entry
+
+
+db_breaker = CircuitBreaker()
+snapshot_cache = SnapshotCache()
+
+
+def read_with_fallback(key: Optional[str], fetch: Callable[[], Any], response: Any = None) -> Any:
+    """
+    Jalankan `fetch` lewat circuit breaker dan simpan hasilnya sebagai snapshot.
+    Jika breaker terbuka atau fetch gagal, sajikan snapshot terakhir dan tandai
+    `response` dengan header X-Data-Stale / X-Data-Age. Tanpa snapshot ->
+    DatabaseUnavailable. `key=None`: lewat breaker saja, tanpa snapshot (untuk
+    lookup satu baris). Exception selain kegagalan database diteruskan apa adanya.
+    """
+    try:
+        data = db_breaker.call(fetch)
+    except Exception as e:
+        if not is_database_error(e): raise
+        cached = snapshot_cache.get(key) if key is not None else None
+        if cached is None:
+            raise DatabaseUnavailable(str(e)) from e
+        saved_at, data = cached
+        if response is not None:
+            response.headers["X-Data-Stale"] = "1"
+            response.headers["X-Data-Age"] = str(int(time.time() - saved_at))
+        return data
+    if key is not None: snapshot_cache.put(key, data)
+    return data
+
+
+class _HeaderSink:
+    def __init__(self):
+        self.headers: Dict[str, str] = {}
+
+
+def read_coalesced(key: str, fetch: Callable[[], Any], response: Any = None,
+                   flight: Optional[SingleFlight] = None, flight_key: Optional[str] = None) -> Any:
+    """
+    read_with_fallback untuk endpoint mahal, dibungkus single-flight: request
+    identik yang bersamaan berbagi satu panggilan breaker, sehingga satu hasil
+    (gagal/lambat/sukses) tercatat sekali per gelombang, bukan sekali per penunggu.
+    Header stale dari leader disalin ke response setiap request.
+
+    `flight_key` (default `key`) boleh memuat versi data agar hasil yang dihitung
+    sebelum data berubah tidak dipakai ulang, sementara snapshot fallback tetap
+    disimpan di satu `key`.
+    """
+    def lead():
+        sink = _HeaderSink()
+        return read_with_fallback(key, fetch, sink), sink.headers
+
+    data, headers = (flight or single_flight).do(flight_key or key, lead)
+    if response is not None:
+        for name, value in headers.items(): response.headers[name] = value
+    return data
+
+
+def probe(fetch: Callable[[], Any], timeout: float = 3.0) -> Dict[str, Any]:
+    """Status breaker + latency satu query ringan, untuk endpoint /health."""
+    started = time.monotonic()
+    ok, error = True, None
+    try:
+        db_breaker.call(fetch, timeout=timeout)
+    except Exception as e:
+        ok, error = False, str(e)[:200]
+    return {
+        "database": "ok" if ok else "unavailable",
+        "probe_latency_ms": round((time.monotonic() - started) * 1000, 1),
+        "probe_error": error,
+        "breaker": db_breaker.snapshot(),
+    }
@@ -0,0 +1,247 @@
+"""
+Retensi log aktivitas: rollup harian + arsip terkompresi.
+
+Tabel log (activity_sijagad, activity_logs) hanya menyimpan entri dalam jendela
+retensi. Entri yang lebih lama dipindahkan per hari ke objek JSONL ter-gzip
+(dipartisi tahun/bulan), dirangkum menjadi hitungan harian per user per aksi
+di tabel `activity_daily_rollups`, lalu dihapus dari tabel. Query riwayat
+membaca tabel (hot) dan arsip sekaligus.
+
+Arsip harus tahan lama dan bisa dibaca semua instance, karena baris aslinya
+dihapus. Lokasinya dipilih lewat SIPRIMA_ARCHIVE_STORE:
+- "storage" : bucket Supabase Storage SIPRIMA_ARCHIVE_BUCKET (untuk Vercel)
+- "local"   : direktori SIPRIMA_ARCHIVE_DIR (server sendiri dengan disk permanen)
+Tanpa konfigurasi, kompaksi menolak jalan; /tmp serverless bukan arsip.
+
+Urutan per hari (arsip -> verifikasi -> rollup -> hapus) aman diulang: objek
+arsip digabung berdasarkan id, dan rollup ditulis ulang dari isi arsip, bukan
+ditambahkan. Baris hanya dihapus setelah isi arsip terbaca kembali utuh.
+"""
+import os
+import gzip
+import json
+import threading
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from .snapshots import LocalSnapshotStore, StorageSnapshotStore
+
+RETENTION_DAYS = int(os.environ.get("SIPRIMA_LOG_RETENTION_DAYS") or 90)
+ARCHIVE_STORE = (os.environ.get("SIPRIMA_ARCHIVE_STORE") or "").lower()
+ARCHIVE_BUCKET = os.environ.get("SIPRIMA_ARCHIVE_BUCKET") or "log-archive"
+ARCHIVE_DIR = os.environ.get("SIPRIMA_ARCHIVE_DIR")
+ARCHIVE_CALL_TIMEOUT = float(os.environ.get("SIPRIMA_ARCHIVE_TIMEOUT") or 60)
+ROLLUP_TABLE = "activity_daily_rollups"
+COMPACT_MAX_DAYS = 31  # batas hari per sekali jalan, agar muat dalam timeout cron
+PAGE_SIZE = 1000
+DELETE_CHUNK = 500
+
+
+class ArchiveUnavailable(RuntimeError):
+    """Arsip tahan lama belum dikonfigurasi atau penulisannya tidak terkonfirmasi."""
+
+
+def _day(value: Any) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+_archive_store = None
+_archive_store_lock = threading.Lock()
+
+
+def get_archive_store():
+    """Store arsip sesuai SIPRIMA_ARCHIVE_STORE, atau None jika belum dikonfigurasi."""
+    global _archive_store
+    with _archive_store_lock:
+        if _archive_store is None:
+            # Upload arsip bisa besar & lama: timeout sendiri, tidak dihitung ke breaker baca
+            if ARCHIVE_STORE == "storage": _archive_store = StorageSnapshotStore(ARCHIVE_BUCKET, timeout=ARCHIVE_CALL_TIMEOUT, breaker=None)
+            elif ARCHIVE_STORE == "local" and ARCHIVE_DIR: _archive_store = LocalSnapshotStore(ARCHIVE_DIR)
+        return _archive_store
+
+
+def set_archive_store(store):
+    """Ganti store arsip (mis. stand-in pada benchmark)."""
+    global _archive_store
+    with _archive_store_lock: _archive_store = store
+
+
+class LogArchive:
+    """Objek arsip per hari: <table>/year=YYYY/month=MM/<table>-YYYY-MM-DD.jsonl.gz"""
+
+    def __init__(self, table: str, store=None):
+        self.table = table
+        self.store = store if store is not None else get_archive_store()
+
+    def name(self, day: date) -> str:
+        return f"{self.table}/year={day.year:04d}/month={day.month:02d}/{self.table}-{day.isoformat()}.jsonl.gz"
+
+    def read_day(self, day: date) -> List[Dict[str, Any]]:
+        if self.store is None: return []
+        data = self.store.get(self.name(day))
+        if not data: return []
+        return [json.loads(line) for line in gzip.decompress(data).decode("utf-8").splitlines() if line.strip()]
+
+    def write_day(self, day: date, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Gabungkan `rows` dengan isi arsip hari itu (dedup id), unggah, lalu baca
+        kembali untuk memastikan objeknya tersimpan utuh; kembalikan seluruh isinya.
+        """
+        if self.store is None: raise ArchiveUnavailable("Lokasi arsip log belum dikonfigurasi (SIPRIMA_ARCHIVE_STORE)")
+        merged = {str(r.get("id")): r for r in self.read_day(day)}
+        for r in rows: merged[str(r.get("id"))] = r
+        out = sorted(merged.values(), key=lambda r: str(r.get("created_at") or ""))
+        body = "".join(json.dumps(r, default=str) + "\n" for r in out).encode("utf-8")
+        data = gzip.compress(body, mtime=0)
+        name = self.name(day)
+        self.store.put(name, data, "application/gzip")
+        if self.store.get(name) != data: raise ArchiveUnavailable(f"Arsip {name} tidak terkonfirmasi setelah diunggah")
+        return out
+
+
+def _fetch_day(client, table: str, day: date) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        page = client.table(table).select("*") \
+            .gte("created_at", day.isoformat()).lt("created_at", (day + timedelta(days=1)).isoformat()) \
+            .order("id", desc=False).range(start, start + PAGE_SIZE - 1).execute().data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE: return rows
+        start += PAGE_SIZE
+
+
+def daily_rollup(table: str, day: date, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    counts: Dict[tuple, int] = {}
+    for r in rows:
+        key = (str(r.get("user_email") or "-"), str(r.get("action") or "-"))
+        counts[key] = counts.get(key, 0) + 1
+    return [{"source": table, "day": day.isoformat(), "user_email": u, "action": a, "count": n}
+            for (u, a), n in sorted(counts.items())]
+
+
+def compact_logs(client, table: str, retention_days: int = RETENTION_DAYS, today: Optional[date] = None,
+                 max_days: int = COMPACT_MAX_DAYS, archive: Optional[LogArchive] = None) -> Dict[str, Any]:
+    """Arsipkan, rollup, lalu hapus entri `table` yang lebih tua dari jendela retensi."""
+    archive = archive or LogArchive(table)
+    if archive.store is None:
+        raise ArchiveUnavailable("Lokasi arsip log belum dikonfigurasi (SIPRIMA_ARCHIVE_STORE); kompaksi dibatalkan")
+    cutoff = (today or date.today()) - timedelta(days=retention_days)
+    summary: Dict[str, Any] = {"table": table, "cutoff": cutoff.isoformat(), "days": [], "archived": 0, "deleted": 0}
+    for _ in range(max_days):
+        oldest = client.table(table).select("created_at").lt("created_at", cutoff.isoformat()) \
+            .order("created_at", desc=False).limit(1).execute().data or []
+        if not oldest: break
+        day = _day(oldest[0].get("created_at"))
+        if day is None: break
+        rows = _fetch_day(client, table, day)
+        if not rows: break
+        # write_day melempar error jika arsip tidak terkonfirmasi; baris tetap di tabel
+        stored = archive.write_day(day, rows)
+        rollup = daily_rollup(table, day, stored)
+        if rollup:
+            client.table(ROLLUP_TABLE).upsert(rollup, on_conflict="source,day,user_email,action").execute()
+        ids = [r.get("id") for r in rows if r.get("id") is not None]
+        for i in range(0, len(ids), DELETE_CHUNK):
+            client.table(table).delete().in_("id", ids[i:i + DELETE_CHUNK]).execute()
+        summary["days"].append(day.isoformat())
+        summary["archived"] += len(rows)
+        summary["deleted"] += len(ids)
+    summary["remaining"] = len(summary["days"]) == max_days
+    return summary
+
+
+def _archived_days(client, table: str, start: Optional[date], upper_day: Optional[date],
+                   filters: Dict[str, Any]) -> Iterator[date]:
+    """Hari yang sudah diarsip (terbaru dulu), dari rollup; dibaca per halaman sesuai kebutuhan."""
+    seen = set()
+    offset = 0
+    while True:
+        query = client.table(ROLLUP_TABLE).select("day").eq("source", table)
+        if start: query = query.gte("day", start.isoformat())
+        if upper_day: query = query.lte("day", upper_day.isoformat())
+        for column in ("user_email", "action"):
+            if column in filters: query = query.eq(column, filters[column])
+        page = query.order("day", desc=True).range(offset, offset + PAGE_SIZE - 1).execute().data or []
+        for r in page:
+            day = _day(r.get("day"))
+            if day is None or day in seen: continue
+            seen.add(day)
+            yield day
+        if len(page) < PAGE_SIZE: return
+        offset += PAGE_SIZE
+
+
+def query_logs(client, table: str, start: Optional[date] = None, end: Optional[date] = None,
+               filters: Optional[Dict[str, Any]] = None, limit: int = 50, before: Optional[str] = None,
+               archive: Optional[LogArchive] = None) -> Dict[str, Any]:
+    """
+    Riwayat log terbaru lebih dulu dari tabel + arsip, dalam rentang [start, end).
+    `before` (created_at entri terakhir halaman sebelumnya) dipakai sebagai kursor.
+    """
+    archive = archive or LogArchive(table)
+    filters = {k: v for k, v in (filters or {}).items() if v is not None}
+    upper = min([v for v in (end.isoformat() if end else None, before) if v is not None], default=None)
+
+    query = client.table(table).select("*")
+    if start: query = query.gte("created_at", start.isoformat())
+    if upper: query = query.lt("created_at", upper)
+    for column, value in filters.items(): query = query.eq(column, value)
+    hot = query.order("created_at", desc=True).limit(limit).execute().data or []
+
+    rows: Dict[str, Dict[str, Any]] = {str(r.get("id")): r for r in hot}
+    if len(hot) < limit and archive.store is not None:
+        # Arsip hanya berisi hari yang lebih tua dari isi tabel; daftar harinya dari rollup
+        # (sama untuk semua instance), dibaca dari hari terbaru mundur
+        for day in _archived_days(client, table, start, _day(upper) if upper else None, filters):
+            for r in archive.read_day(day):
+                created = str(r.get("created_at") or "")
+                if upper and created >= upper: continue
+                if start and created < start.isoformat(): continue
+                if any(str(r.get(k)) != str(v) for k, v in filters.items()): continue
+                rows.setdefault(str(r.get("id")), r)
+            if len(rows) >= limit: break
+
+    data = sorted(rows.values(), key=lambda r: str(r.get("created_at") or ""), reverse=True)[:limit]
+    hot_rows = {id(h) for h in hot}
+    from_hot = sum(1 for r in data if id(r) in hot_rows)
+    return {
+        "data": data,
+        "next_before": str(data[-1].get("created_at")) if len(data) == limit else None,
+        "sources": {"hot": from_hot, "archive": len(data) - from_hot},
+    }
+
+
+def daily_counts(client, table: str, start: date, end: date) -> List[Dict[str, Any]]:
+    """Hitungan harian per user per aksi: rollup untuk hari yang sudah diarsip, tabel untuk sisanya."""
+    rolled = client.table(ROLLUP_TABLE).select("day, user_email, action, count").eq("source", table) \
+        .gte("day", start.isoformat()).lt("day", end.isoformat()).execute().data or []
+    rolled_days = {str(r.get("day"))[:10] for r in rolled}
+    counts: Dict[tuple, int] = {}
+    for r in rolled:
+        key = (str(r.get("day"))[:10], str(r.get("user_email")), str(r.get("action")))
+        counts[key] = counts.get(key, 0) + int(r.get("count") or 0)
+
+    offset = 0
+    while True:
+        page = client.table(table).select("id, user_email, action, created_at") \
+            .gte("created_at", start.isoformat()).lt("created_at", end.isoformat()) \
+            .order("id", desc=False).range(offset, offset + PAGE_SIZE - 1).execute().data or []
+        for r in page:
+            day = str(r.get("created_at") or "")[:10]
+            if not day or day in rolled_days: continue
+            key = (day, str(r.get("user_email") or "-"), str(r.get("action") or "-"))
+            counts[key] = counts.get(key, 0) + 1
+        if len(page) < PAGE_SIZE: break
+        offset += PAGE_SIZE
+
+    return [{"day": d, "user_email": u, "action": a, "count": n} for (d, u, a), n in sorted(counts.items())]
+
+
+def parse_day(value: Optional[str], default: Optional[date] = None) -> Optional[date]:
+    """Parameter tanggal dari query string (YYYY-MM-DD); ValueError jika formatnya salah."""
+    if not value: return default
+    return datetime.strptime(value[:10], "%Y-%m-%d").date()
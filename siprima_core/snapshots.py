@@ -0,0 +1,125 @@
+"""
+Penyimpanan snapshot laporan yang dihitung di muka (analitik, laporan H-90, Excel).
+
+Cron harian menulis snapshot; endpoint baca menyajikannya apa adanya tanpa
+query ke database. Backend penyimpanan dipilih lewat SIPRIMA_SNAPSHOT_STORE:
+- "storage" : bucket Supabase Storage SIPRIMA_SNAPSHOT_BUCKET (default; dipakai
+              bersama semua instance serverless, sehingga invalidasi berlaku di semua)
+- "local"   : file di SIPRIMA_SNAPSHOT_DIR, hanya untuk satu proses (dev/server
+              sendiri); di Vercel invalidasinya tidak sampai ke instance lain
+"""
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+from .db import call_timeout, get_supabase
+from .resilience import CircuitBreaker, db_breaker
+
+SNAPSHOT_STORE = (os.environ.get("SIPRIMA_SNAPSHOT_STORE") or "storage").lower()
+SNAPSHOT_DIR = Path(os.environ.get("SIPRIMA_SNAPSHOT_DIR") or Path(tempfile.gettempdir()) / "siprima_snapshots")
+SNAPSHOT_BUCKET = os.environ.get("SIPRIMA_SNAPSHOT_BUCKET") or "snapshots"
+SNAPSHOT_CALL_TIMEOUT = float(os.environ.get("SIPRIMA_SNAPSHOT_TIMEOUT") or 3)
+LIST_PAGE_SIZE = 1000
+
+
+class LocalSnapshotStore:
+    def __init__(self, directory: Path = SNAPSHOT_DIR):
+        self.directory = Path(directory)
+
+    def put(self, name: str, data: bytes, content_type: str = "application/octet-stream"):
+        path = self.directory / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f: f.write(data)
+        os.replace(tmp, path)
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            return (self.directory / name).read_bytes()
+        except OSError:
+            return None
+
+    def list(self, prefix: str) -> List[str]:
+        root = self.directory / prefix
+        return sorted(p.relative_to(self.directory).as_posix() for p in root.rglob("*") if p.is_file())
+
+    def delete(self, names: List[str]):
+        for name in names:
+            try: (self.directory / name).unlink()
+            except FileNotFoundError: pass
+
+
+class StorageSnapshotStore:
+    """
+    Snapshot di bucket Supabase Storage (object storage). Setiap panggilan dibatasi
+    `timeout` (termasuk retry) dan, jika `breaker` diberikan, lewat circuit breaker
+    database: saat Supabase down, snapshot gagal cepat alih-alih menunggu timeout.
+    """
+
+    def __init__(self, bucket: str = SNAPSHOT_BUCKET, client_factory: Callable = get_supabase,
+                 timeout: float = SNAPSHOT_CALL_TIMEOUT, breaker: Optional[CircuitBreaker] = db_breaker):
+        self.bucket = bucket
+        self.client_factory = client_factory
+        self.timeout = timeout
+        self.breaker = breaker
+
+    def _bucket(self):
+        client = self.client_factory()
+        if client is None: raise RuntimeError("Supabase client tidak tersedia")
+        return client.storage.from_(self.bucket)
+
+    def _call(self, fn: Callable[[], Any]) -> Any:
+        if self.breaker is not None: return self.breaker.call(fn, timeout=self.timeout)
+        with call_timeout(self.timeout):
+            return fn()
+
+    def put(self, name: str, data: bytes, content_type: str = "application/octet-stream"):
+        self._call(lambda: self._bucket().upload(name, data, {"content-type": content_type, "upsert": "true"}))
+
+    def get(self, name: str) -> Optional[bytes]:
+        try:
+            return self._call(lambda: self._bucket().download(name))
+        except Exception:
+            return None
+
+    def list(self, prefix: str) -> List[str]:
+        """Semua nama objek di bawah `prefix` (Storage hanya me-list satu folder per panggilan)."""
+        bucket = self._bucket()
+        names: List[str] = []
+        folders = [prefix.strip("/")]
+        while folders:
+            folder = folders.pop()
+            offset = 0
+            while True:
+                items = self._call(lambda: bucket.list(folder, {"limit": LIST_PAGE_SIZE, "offset": offset})) or []
+                for item in items:
+                    path = f"{folder}/{item['name']}" if folder else item["name"]
+                    # Entri tanpa id adalah folder
+                    if item.get("id") is None: folders.append(path)
+                    else: names.append(path)
+                if len(items) < LIST_PAGE_SIZE: break
+                offset += LIST_PAGE_SIZE
+        return sorted(names)
+
+    def delete(self, names: List[str]):
+        if names: self._call(lambda: self._bucket().remove(names))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LocalSnapshotStore() if SNAPSHOT_STORE == "local" else StorageSnapshotStore()
+        return _store
+
+
+def set_snapshot_store(store):
+    """Ganti store (mis. stand-in pada benchmark/load test)."""
+    global _store
+    with _store_lock: _store = store